@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Measures serial vs bulk price download throughput against a local stand-in for the yahoo endpoint,
+# no network required. The stand-in adds a fixed latency per request and fails some requests to exercise retries.
+# It serves a deterministic history per ticker, so after the full download we move its last date forward a few
+# bars and time an incremental refresh as well.
+import argparse
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+import requests
+
+from alfred.data import download_ticker_list, bulk_download_ticker_list
+
+
+def make_handler(latency, failure_rate, bars, state):
+    class YahooStandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if random.random() < failure_rate:
+                self.send_response(429)
+                self.end_headers()
+                return
+            query = parse_qs(urlparse(self.path).query)
+            tickers = query["symbols"][0].split(",")
+            total = bars + state["extra_bars"]
+            dates = pd.bdate_range(start="2000-01-03", periods=total)
+            frames = {}
+            for ticker in tickers:
+                seed = abs(hash(ticker)) % (2 ** 32)
+                close = 100 + np.random.default_rng(seed).standard_normal(total).cumsum()
+                volume = np.random.default_rng(seed + 1).integers(100000, 1000000, total)
+                frame = pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                                      "Volume": volume}, index=dates)
+                if "start" in query:
+                    frame = frame[frame.index >= query["start"][0]]
+                frames[ticker] = frame
+            df = pd.concat(frames, axis=1)
+            df.index.name = "Date"
+            body = df.to_csv().encode()
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return YahooStandIn
+
+
+def make_fetch(url):
+    session = requests.Session()
+
+    def fetch(tickers, interval, start=None):
+        params = {"symbols": ",".join(tickers), "interval": interval}
+        if start is not None:
+            params["start"] = start
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        return pd.read_csv(io.StringIO(response.text), header=[0, 1], index_col=0, parse_dates=True)
+
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request at the stand-in")
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--bars", type=int, default=2500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=10.0)
+    parser.add_argument("--new-bars", type=int, default=5, help="bars added before the incremental refresh")
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    state = {"extra_bars": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency, args.failure_rate, args.bars, state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetch = make_fetch(f"http://127.0.0.1:{server.server_address[1]}/chart")
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        if not args.skip_serial:
+            start = time.monotonic()
+            # the serial path has no retry, so failures show up as bad tickers
+            bad = download_ticker_list(tickers, output_dir, fetch=fetch)
+            serial = time.monotonic() - start
+            print(f"serial: {serial:.2f}s {len(tickers) / serial:.1f} tickers/s bad: {len(bad)}")
+
+        start = time.monotonic()
+        bad = bulk_download_ticker_list(tickers, output_dir, workers=args.workers, batch_size=args.batch_size,
+                                        requests_per_second=args.rate, backoff=0.1, fetch=fetch)
+        bulk = time.monotonic() - start
+        print(f"bulk: {bulk:.2f}s {len(tickers) / bulk:.1f} tickers/s bad: {len(bad)}")
+
+        state["extra_bars"] = args.new_bars
+        start = time.monotonic()
+        bad = bulk_download_ticker_list(tickers, output_dir, workers=args.workers, batch_size=args.batch_size,
+                                        requests_per_second=args.rate, backoff=0.1, fetch=fetch, incremental=True)
+        incremental = time.monotonic() - start
+        rows = len(pd.read_csv(os.path.join(output_dir, f"{tickers[0]}.csv")))
+        print(f"incremental: {incremental:.2f}s {len(tickers) / incremental:.1f} tickers/s bad: {len(bad)} "
+              f"rows in {tickers[0]}: {rows} (expected {args.bars + args.new_bars})")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Serial vs asyncio fundamentals fetch against a local mock of the alpha vantage endpoint, no network or api key.
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from alfred.data import AlphaDownloader, fetch_fundamentals, fetch_treasury_yields
+
+
+def earnings_payload(quarters):
+    quarterly = [{"fiscalDateEnding": f"{2000 + q // 4}-{3 * (q % 4) + 1:02d}-28",
+                  "reportedDate": f"{2000 + q // 4}-{3 * (q % 4) + 2:02d}-15",
+                  "reportedEPS": "1.1", "estimatedEPS": "1.0", "surprise": "0.1", "surprisePercentage": "10",
+                  "reportTime": "pre-market"} for q in range(quarters)]
+    return {"annualEarnings": [{"fiscalDateEnding": "2020-12-31", "reportedEPS": "4.4"}],
+            "quarterlyEarnings": quarterly}
+
+
+def income_payload(quarters):
+    reports = [{"fiscalDateEnding": f"{2000 + q // 4}-{3 * (q % 4) + 1:02d}-28", "totalRevenue": "1000",
+                "grossProfit": "400", "operatingIncome": "200", "netIncome": "100",
+                "costofGoodsAndServicesSold": "600", "costOfRevenue": "600"} for q in range(quarters)]
+    return {"quarterlyReports": reports}
+
+
+def make_handler(latency, quarters):
+    class AlphaMock(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            function = parse_qs(urlparse(self.path).query)["function"][0]
+            if function == "EARNINGS":
+                payload = earnings_payload(quarters)
+            elif function == "INCOME_STATEMENT":
+                payload = income_payload(quarters)
+            else:
+                payload = {"data": [{"date": f"{2000 + m // 12}-{m % 12 + 1:02d}-01", "value": "4.1"}
+                                    for m in range(quarters * 3)]}
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AlphaMock
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request at the mock")
+    parser.add_argument("--quarters", type=int, default=80)
+    parser.add_argument("--requests-per-minute", type=int, default=6000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency, args.quarters))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/query"
+    symbols = [f"T{i:04d}" for i in range(args.symbols)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key_file = os.path.join(tmp, "alpha.txt")
+        with open(key_file, "w") as f:
+            f.write("mock")
+        alpha = AlphaDownloader(key_file=key_file, cache_dir=None, base_url=url)
+
+        start = time.monotonic()
+        for symbol in symbols:
+            alpha.earnings(symbol)
+            alpha.margins(symbol)
+        alpha.treasury_yields()
+        serial = time.monotonic() - start
+        print(f"serial: {serial:.2f}s {len(symbols) / serial:.1f} symbols/s")
+
+        completed = []
+        start = time.monotonic()
+        fetch_treasury_yields(alpha, requests_per_minute=args.requests_per_minute)
+        fetch_fundamentals(alpha, symbols, lambda symbol, earnings, margins, error: completed.append(error),
+                           requests_per_minute=args.requests_per_minute)
+        concurrent = time.monotonic() - start
+        errors = len([error for error in completed if error is not None])
+        print(f"concurrent: {concurrent:.2f}s {len(symbols) / concurrent:.1f} symbols/s "
+              f"completed: {len(completed)} errors: {errors}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
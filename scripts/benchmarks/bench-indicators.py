@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# The indicator features computed per symbol with pandas (the way they would be with pandas-ta, one symbol and one
+# indicator at a time) vs all symbols at once through the feature planner and alfred.data.indicators, on a
+# generated long format panel. Also reports how far apart the two are.
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from alfred.data import plan_features
+
+INDICATORS = ["RSI_14", "MACD", "MACD_signal", "MACD_hist", "ATR_14", "Bollinger_width_20", "Realized_vol_20"]
+
+
+def make_panel(symbols, bars, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(symbols):
+        length = int(rng.integers(bars // 4, bars + 1))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        spread = rng.uniform(0, 0.02, length)
+        frames.append(pd.DataFrame({"Symbol": f"T{i:05d}", "Close": close, "High": close * (1 + spread),
+                                    "Low": close * (1 - spread)},
+                                   index=pd.bdate_range("2000-01-03", periods=length)))
+    return frames
+
+
+def pandas_indicators(df):
+    close = df["Close"]
+    delta = close.diff()
+
+    def wilder(series, n):
+        return series.ewm(alpha=1 / n, adjust=False, min_periods=n).mean()
+
+    def ema(series, n):
+        return series.ewm(span=n, adjust=False, min_periods=n).mean()
+
+    out = pd.DataFrame(index=df.index)
+    gain = wilder(delta.clip(lower=0).where(delta.notna()), 14)
+    loss = wilder((-delta).clip(lower=0).where(delta.notna()), 14)
+    out["RSI_14"] = (100 - 100 / (1 + gain / loss)).where(loss != 0, 100.0).where(gain.notna())
+    out["MACD"] = ema(close, 12) - ema(close, 26)
+    out["MACD_signal"] = ema(out["MACD"].dropna(), 9).reindex(df.index)
+    out["MACD_hist"] = out["MACD"] - out["MACD_signal"]
+    previous_close = close.shift()
+    true_range = pd.concat([df["High"] - df["Low"], (df["High"] - previous_close).abs(),
+                            (df["Low"] - previous_close).abs()], axis=1).max(axis=1)
+    out["ATR_14"] = wilder(true_range, 14)
+    out["Bollinger_width_20"] = 4 * close.rolling(20).std() / close.rolling(20).mean()
+    out["Realized_vol_20"] = np.log(close / previous_close).rolling(20).std() * np.sqrt(252)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=5000, help="longest history in bars")
+    args = parser.parse_args()
+
+    frames = make_panel(args.symbols, args.bars)
+    panel = pd.concat(frames)
+    print(f"{args.symbols} symbols, {len(panel)} rows, {len(INDICATORS)} indicators")
+
+    start = time.monotonic()
+    expected = pd.concat([pandas_indicators(frame) for frame in frames])
+    per_symbol = time.monotonic() - start
+    print(f"per symbol pandas: {per_symbol:.2f}s ({len(panel) / per_symbol / 1e6:.2f}M rows/s)")
+
+    start = time.monotonic()
+    actual = plan_features(INDICATORS).compute(panel.copy(), symbol_column="Symbol")
+    panel_time = time.monotonic() - start
+    print(f"panel indicators: {panel_time:.2f}s ({len(panel) / panel_time / 1e6:.2f}M rows/s, "
+          f"{per_symbol / panel_time:.1f}x)")
+
+    for col in INDICATORS:
+        a = expected[col].to_numpy()
+        b = actual[col].to_numpy()
+        print(f"  {col}: same NaN rows: {(np.isnan(a) == np.isnan(b)).all()}, "
+              f"max abs difference: {np.nanmax(np.abs(a - b)):.3g}")
+
+
+if __name__ == "__main__":
+    main()
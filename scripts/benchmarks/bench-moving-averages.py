@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Per symbol pandas rolling means (attach_moving_average_diffs) vs the panel engine
+# (attach_panel_moving_average_diffs) on a generated long format panel, and how far apart their outputs are.
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from alfred.data import attach_moving_average_diffs, attach_panel_moving_average_diffs
+
+
+def make_panel(symbols, bars, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(symbols):
+        # uneven histories, like a real symbol list
+        length = int(rng.integers(bars // 4, bars + 1))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        volume = rng.integers(100000, 10000000, length).astype(np.float64)
+        frames.append(pd.DataFrame({"Symbol": f"T{i:05d}", "Close": close, "Volume": volume},
+                                   index=pd.bdate_range("2000-01-03", periods=length)))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=5000, help="longest history in bars")
+    args = parser.parse_args()
+
+    frames = make_panel(args.symbols, args.bars)
+    panel = pd.concat(frames)
+    print(f"{args.symbols} symbols, {len(panel)} rows")
+
+    start = time.monotonic()
+    expected = pd.concat([attach_moving_average_diffs(frame.copy())[0] for frame in frames])
+    per_symbol = time.monotonic() - start
+    print(f"per symbol pandas: {per_symbol:.2f}s")
+
+    start = time.monotonic()
+    actual, columns = attach_panel_moving_average_diffs(panel.copy(), symbol_column="Symbol")
+    engine = time.monotonic() - start
+    print(f"panel engine: {engine:.2f}s ({per_symbol / engine:.1f}x)")
+
+    expected = expected[columns].to_numpy()
+    actual = actual[columns].to_numpy()
+    same_nans = (np.isnan(expected) == np.isnan(actual)).all()
+    print(f"same NaN rows: {same_nans}, max abs difference: {np.nanmax(np.abs(expected - actual)):.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Packs every {symbol}_unscaled file for a symbol list into one memory mapped panel that CachedPanelDataSet can
+# open without parsing anything.
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from alfred.data import build_panel, feature_columns, label_columns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=str, help="Symbols to use separated by comma")
+    parser.add_argument('--symbol-file', type=str, help="List of symbols in a file")
+    parser.add_argument('--data', type=str, default="./data", help="data dir (./data)")
+    parser.add_argument('--out', type=str, default=None, help="panel dir (default: {data}/{list name}_panel)")
+    parser.add_argument('--suffix', type=str, default="_unscaled", help="symbol file suffix (_unscaled)")
+    parser.add_argument('--date-column', type=str, default="Unnamed: 0",
+                        help="date column of the csv files (Unnamed: 0, the _unscaled files have an unnamed index)")
+    parser.add_argument('--columns', type=str, nargs="+", default=feature_columns + label_columns,
+                        help="columns to pack (default: feature and label columns)")
+    args = parser.parse_args()
+
+    if args.symbols:
+        symbols = args.symbols.split(',')
+        name = "symbols"
+    else:
+        symbols = pd.read_csv(args.symbol_file)["Symbols"].tolist()
+        name = os.path.splitext(os.path.basename(args.symbol_file))[0]
+    symbols = [symbol for symbol in symbols if symbol != "^VIX"]
+    out = args.out if args.out is not None else os.path.join(args.data, f"{name}_panel")
+
+    start = time.monotonic()
+    panel = build_panel(symbols, args.data, out, args.columns, file_suffix=args.suffix, date_column=args.date_column)
+    elapsed = time.monotonic() - start
+    print(f"Packed {len(panel.symbols)} symbols x {len(panel.dates)} dates x {len(panel.features)} features "
+          f"into {out} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
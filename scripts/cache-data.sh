@@ -6,7 +6,23 @@ if [ -z "$1" ]; then
     exit 1
 fi
 
-python scripts/cache-prices.py "--symbol-file=$1" &&
+# Progress for this list is kept in a job manifest. If a run dies partway, rerunning picks up where it left off
+# and only retries failed symbols. The manifest is removed once every stage has finished with no failed symbols,
+# the stages record failures and carry on, so a manifest with failures is kept for the next run to retry them.
+mkdir -p ./data
+MANIFEST="./data/$(basename "$1" .csv)_manifest.jsonl"
+# The build cache outlives the manifest: symbols whose prices, fundamentals, macro series, parameters and code are
+# unchanged since their last build are not rebuilt.
+BUILD_CACHE="./data/build_cache.jsonl"
+
+python scripts/cache-prices.py "--symbol-file=$1" "--manifest=$MANIFEST" &&
 python scripts/cache-rates.py &&
-python scripts/cache-fundementals.py "--symbol-file=$1" &&
-python scripts/create-final-data-set.py "--symbol-file=$1"
\ No newline at end of file
+python scripts/cache-fundementals.py "--symbol-file=$1" "--manifest=$MANIFEST" &&
+python scripts/create-final-data-set.py "--symbol-file=$1" "--manifest=$MANIFEST" "--build-cache=$BUILD_CACHE" || exit 1
+
+if python -c 'import sys; from alfred.data import JobManifest; sys.exit(JobManifest(sys.argv[1]).has_failures())' \
+        "$MANIFEST"; then
+    rm -f "$MANIFEST"
+else
+    echo "Some symbols failed, keeping $MANIFEST so the next run retries them"
+fi
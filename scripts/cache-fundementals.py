@@ -1,54 +1,101 @@
 import pandas as pd
 import os
+import time
 import argparse
-from alfred.data import AlphaDownloader
+from alfred.data import AlphaDownloader, JobManifest, fetch_fundamentals, build_event_table, write_event_table
+from alfred.data.readers import data_file_exists
+from alfred.data.downloaders import ALPHA_URL
 
-def main(symbols_file, data_dir):
+def main(symbols_file, data_dir, manifest_path=None, concurrent=False, requests_per_minute=75, alpha_url=ALPHA_URL,
+         storage="csv"):
     df_symbols = pd.read_csv(symbols_file)
-    alpha = AlphaDownloader()
+    alpha = AlphaDownloader(cache_dir=os.path.join(data_dir, "alpha_cache"), base_url=alpha_url)
 
-    for symbol in df_symbols['Symbols']:
+    symbols = [symbol for symbol in df_symbols['Symbols'] if symbol != '^VIX']
+    manifest = None
+    if manifest_path is not None:
+        manifest = JobManifest(manifest_path)
+        manifest.compact()
+        pending = manifest.pending(symbols, "fundamentals")
+        print(f"Resuming: {len(symbols) - len(pending)} of {len(symbols)} symbols already have fundamentals")
+        symbols = pending
+
+    if concurrent:
+        fetch_concurrently(alpha, symbols, data_dir, manifest, requests_per_minute, storage)
+        symbols = []
+
+    for symbol in symbols:
         print(f"Processing {symbol}")
-        # skip the fix
-        if symbol == '^VIX':
+        if manifest is None:
+            process_symbol(alpha, symbol, data_dir, storage)
             continue
+        try:
+            ok = process_symbol(alpha, symbol, data_dir, storage)
+            manifest.record(symbol, "fundamentals", ok, None if ok else "pricing data file not found")
+        except Exception as e:
+            # keep going, the failure is recorded and retried on the next run
+            print(f"Failed to process {symbol}: {e}")
+            manifest.record(symbol, "fundamentals", False, e)
 
-        _, quarterly_earnings = alpha.earnings(symbol)
-        margins = alpha.margins(symbol)
+    print(f"Alpha vantage {alpha.cache.stats()}")
+    if manifest is not None:
+        manifest.print_summary("fundamentals", [symbol for symbol in df_symbols['Symbols'] if symbol != '^VIX'])
 
-        price_file_path = os.path.join(data_dir, f"{symbol}.csv")
 
-        if os.path.exists(price_file_path):
-            df_prices = pd.read_csv(price_file_path)
-            quarterly_earnings.index = pd.to_datetime(quarterly_earnings["Date"])
-            quarterly_earnings = quarterly_earnings.drop(columns=['Date'])
-            df_prices.index = pd.to_datetime(df_prices['Date'])
-            df_prices = df_prices.drop(columns=['Date'])
+def fetch_concurrently(alpha, symbols, data_dir, manifest, requests_per_minute, storage="csv"):
+    # check before calling the api so a missing price file doesn't burn quota
+    with_prices = []
+    for symbol in symbols:
+        if data_file_exists(os.path.join(data_dir, f"{symbol}.csv")):
+            with_prices.append(symbol)
+        else:
+            print(f"Pricing data file not found for {symbol}")
+            if manifest is not None:
+                manifest.record(symbol, "fundamentals", False, "pricing data file not found")
 
-            margins.index = pd.to_datetime(margins['Date'])
-            margins = margins.drop(columns=['Date'])
+    def on_result(symbol, quarterly_earnings, margins, error):
+        print(f"Processing {symbol}")
+        if error is None:
+            try:
+                merge_and_write(symbol, data_dir, quarterly_earnings, margins, storage)
+            except Exception as e:
+                error = e
+        if error is not None:
+            print(f"Failed to process {symbol}: {error}")
+        if manifest is not None:
+            manifest.record(symbol, "fundamentals", error is None, error)
 
-            # Merging data
-            df_combined = df_prices.join(quarterly_earnings, how='outer')
-            df_combined = df_combined.join(margins, how='outer')
+    start = time.monotonic()
+    requests = fetch_fundamentals(alpha, with_prices, on_result, requests_per_minute)
+    elapsed = time.monotonic() - start
+    print(f"Fetched {len(with_prices)} symbols with {requests} requests in {elapsed:.2f}s")
 
-            # forward will earnings - prevents lookahead
-            df_combined.fillna(method='ffill', inplace=True)
 
-            # after forward fill, we may still have na if price goes back further than earnings, treat these as 0
-            df_combined.fillna(0, inplace=True)
+def process_symbol(alpha, symbol, data_dir, storage="csv"):
+    price_file_path = os.path.join(data_dir, f"{symbol}.csv")
 
-            min_date = df_combined.index.min()
-            max_date = df_combined.index.max()
-            print(f"Min date for {symbol}: {min_date}")
-            print(f"Max date for {symbol}: {max_date}")
+    # check before calling the api so a missing price file doesn't burn quota
+    if not data_file_exists(price_file_path):
+        print(f"Pricing data file not found for {symbol}")
+        return False
 
-            # Writing to CSV
-            output_path = os.path.join(data_dir, f"{symbol}_fundamentals.csv")
-            df_combined.to_csv(output_path)
-            print(f"Written combined data to {output_path}")
-        else:
-            print(f"Pricing data file not found for {symbol}")
+    _, quarterly_earnings = alpha.earnings(symbol)
+    margins = alpha.margins(symbol)
+    merge_and_write(symbol, data_dir, quarterly_earnings, margins, storage)
+    return True
+
+
+def merge_and_write(symbol, data_dir, quarterly_earnings, margins, storage="csv"):
+    # only the report dates are stored, read_fundamentals expands them onto the daily prices at read time
+    events = build_event_table(quarterly_earnings, margins)
+
+    min_date = events.index.min()
+    max_date = events.index.max()
+    print(f"Min date for {symbol}: {min_date}")
+    print(f"Max date for {symbol}: {max_date}")
+
+    output_path = write_event_table(symbol, data_dir, events, storage)
+    print(f"Written {len(events)} events to {output_path}")
 
 
 if __name__ == "__main__":
@@ -56,6 +103,16 @@ if __name__ == "__main__":
     parser.add_argument("--symbol-file", type=str, help="Path to the CSV file containing stock symbols")
     parser.add_argument("--data-dir", default="./data", type=str,
                         help="Directory to look for pricing data and save output")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Job manifest, symbols it records as done are skipped on rerun")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Fetch symbols concurrently with asyncio, writing each as it completes")
+    parser.add_argument("--requests-per-minute", type=int, default=75,
+                        help="Alpha vantage quota used by --concurrent (default: 75)")
+    parser.add_argument("--alpha-url", type=str, default=ALPHA_URL, help="Alpha vantage endpoint (for a local mock)")
+    parser.add_argument("--storage", type=str, choices=["csv", "parquet"], default="csv",
+                        help="File format for the output (default: csv)")
 
     args = parser.parse_args()
-    main(args.symbol_file, args.data_dir)
+    main(args.symbol_file, args.data_dir, args.manifest, args.concurrent, args.requests_per_minute, args.alpha_url,
+         args.storage)
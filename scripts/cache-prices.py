@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 import pandas as pd
 import argparse
-from alfred.data import download_ticker_list
+from alfred.data import download_ticker_list, bulk_download_ticker_list, JobManifest
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-s", "--symbols", help="Symbols to use (default: SPY), separated by comma")
 parser.add_argument("-f", "--symbol-file", help="Load symbols from a file")
-parser.add_argument("-i", "--interval", choices=['1d', '1wk', '1mo'], default='1d', help="Load symbols from a file")
+parser.add_argument("-i", "--interval", choices=['1d', '1wk', '1mo'], default='1d',
+                    help="Bar size (1d), weekly and monthly bars can be derived locally with resample-prices.py")
 parser.add_argument("-fo", "--symbol-file-out", default="./lists/symbols.csv",
                     help="Output file - all bad tickers trimmed")
 parser.add_argument("-o", "--output-dir", default="./data", help="Output directory (default: ./data)")
+parser.add_argument("-w", "--workers", type=int, default=1,
+                    help="Download with a pool of workers (default: 1, the serial downloader)")
+parser.add_argument("-b", "--batch-size", type=int, default=20, help="Tickers per request in bulk mode (default: 20)")
+parser.add_argument("-r", "--rate", type=float, default=2.0, help="Max requests per second in bulk mode (default: 2)")
+parser.add_argument("--incremental", action="store_true",
+                    help="Only fetch bars newer than each cached file and append them in place")
+parser.add_argument("-m", "--manifest", help="Job manifest, symbols it records as done are skipped on rerun")
 
 
 args = parser.parse_args()
@@ -27,7 +35,27 @@ if args.symbol_file is not None:
 
 
 symbols = list(set(symbols))
-bad_symbols = download_ticker_list(symbols, args.output_dir, interval=args.interval)
+
+manifest = None
+to_download = symbols
+if args.manifest is not None:
+    manifest = JobManifest(args.manifest)
+    manifest.compact()
+    to_download = manifest.pending(symbols, "prices")
+    print(f"Resuming: {len(symbols) - len(to_download)} of {len(symbols)} symbols already have prices")
+
+if args.workers > 1:
+    bad_symbols = bulk_download_ticker_list(to_download, args.output_dir, interval=args.interval,
+                                            workers=args.workers, batch_size=args.batch_size,
+                                            requests_per_second=args.rate, incremental=args.incremental,
+                                            manifest=manifest)
+else:
+    bad_symbols = download_ticker_list(to_download, args.output_dir, interval=args.interval,
+                                       incremental=args.incremental, manifest=manifest)
+
+if manifest is not None:
+    bad_symbols = [symbol for symbol in symbols if not manifest.is_done(symbol, "prices")]
+    manifest.print_summary("prices", symbols)
 
 if bad_symbols is None:
     final_symbols = set(symbols)
@@ -2,15 +2,24 @@ import pandas as pd
 import os
 import argparse
 from alfred import data
+from alfred.data.downloaders import ALPHA_URL
 
-def main(data_dir):
-    alpha = data.AlphaDownloader()
-    alpha.treasury_yields_to_csv(csv_file=f"{data_dir}/treasuries.csv")
+def main(data_dir, concurrent=False, alpha_url=ALPHA_URL):
+    alpha = data.AlphaDownloader(cache_dir=os.path.join(data_dir, "alpha_cache"), base_url=alpha_url)
+    if concurrent:
+        # all maturities are requested at once
+        yield_data = data.fetch_treasury_yields(alpha)
+        yield_data.to_csv(f"{data_dir}/treasuries.csv")
+    else:
+        alpha.treasury_yields_to_csv(csv_file=f"{data_dir}/treasuries.csv")
+    print(f"Alpha vantage {alpha.cache.stats()}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fetch rates.")
     parser.add_argument("--data-dir", default="./data", type=str,
                         help="Directory to look for pricing data and save output")
+    parser.add_argument("--concurrent", action="store_true", help="Request every maturity concurrently")
+    parser.add_argument("--alpha-url", type=str, default=ALPHA_URL, help="Alpha vantage endpoint (for a local mock)")
 
     args = parser.parse_args()
-    main(args.data_dir)
+    main(args.data_dir, args.concurrent, args.alpha_url)
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
 
-from alfred.data import attach_moving_average_diffs, read_file
+from alfred.data import (BuildCache, JobManifest, asof_join, build_cross_section, build_pair_features, feature_columns,
+                         load_macro_series, load_pairs, plan_features, read_fundamentals, read_symbol_file,
+                         write_frame)
+from alfred.data.cross_section import SECTOR_COLUMN
+from alfred.data.fundamentals import FUNDAMENTAL_COLUMNS, events_file
+from alfred.data.labels import LABEL_KINDS
+from alfred.data.readers import PARTITION_INDEX, PARTITION_VERSION, columnar_path
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 import argparse
+import importlib
+import json
 import os
+import shutil
+import time
 
 initial_columns_to_keep = [
     "Symbol",
@@ -17,43 +29,39 @@ initial_columns_to_keep = [
     'Margin_Net_Profit'
 ]
 
-def add_vix(final_df, args):
-    vix = pd.read_csv(f"{args.data}/^VIX.csv")
-    vix.index = pd.to_datetime(vix['Date'])
-    vix = vix[["Close"]]
-    vix.rename(columns={'Close': 'VIX'}, inplace=True)
-    earliest_date = final_df.index.min()
-    vix = vix[vix.index >= earliest_date]
-    final_df = final_df.join(vix, how='outer')
-    final_df.fillna(method='ffill', inplace=True)
-    final_df.fillna(method='bfill', inplace=True)
-    return final_df
+# the script and the library code it builds with, editing any of them invalidates the build cache
+code_files = [os.path.abspath(__file__)] + [importlib.import_module(module).__file__ for module in
+                                            [f"alfred.data.{module}" for module in
+                                             ["processors", "feature_graph", "macro", "fundamentals", "readers",
+                                              "cross_section", "pairs", "indicators", "labels"]] +
+                                            ["alfred.utils.moments"]]
 
+# macro series (VIX, treasury yields), the cross section (None unless --cross-sectional) and the pair features (None
+# unless --pairs) for the run, loaded once by main and handed to each worker by its initializer
+macro_series = None
+cross_section = None
+pair_features = None
 
-def add_treasuries(final_df, args):
-    treasuries = pd.read_csv(f"{args.data}/treasuries.csv")
-    treasuries.index = pd.to_datetime(treasuries['date'])
-    treasuries = treasuries.drop(columns=['date'])
 
-    # First, sort by index
-    final_df = final_df.sort_index()
+def set_run_data(macro, cross, pairs):
+    global macro_series, cross_section, pair_features
+    macro_series = macro
+    cross_section = cross
+    pair_features = pairs
 
-    # Then, sort by the 'Symbol' column, maintaining the order of the index
-    final_df = final_df.sort_values(by='Symbol', kind='mergesort')
 
-    earliest_date = final_df.index.min()
+def add_macro_series(final_df, plan):
+    # backward only as-of join of the requested macro series, rows from before one of them starts are dropped rather
+    # than back filled. Skipped when none of the requested columns are macro series
+    requested = [col for col in macro_series.columns if col in plan.sources]
+    if not requested:
+        return final_df
+    return asof_join(final_df, macro_series[requested])
 
-    treasuries_filtered = treasuries[treasuries.index >= earliest_date]
 
-    # Step 3: Perform the join
-    final_df = final_df.join(treasuries_filtered, how='outer')
-
-    # forward fill - prevents lookahead
-    final_df.fillna(method='ffill', inplace=True)
-
-    # backfill anything left over
-    final_df.fillna(method='bfill', inplace=True)
-    return final_df
+def unnamed_index(df):
+    # the _unscaled files have always had an unnamed date index, readers expect it as "Unnamed: 0"
+    return df.rename_axis(None)
 
 
 import pandas as pd
@@ -83,15 +91,6 @@ def align_date_range(final_df):
     return filtered_df, final_min_date, final_max_date
 
 
-def attach_price_prediction_labels(args, columns, df):
-    # attach the labels for price movement
-    for pred in args.pred:
-        label = f'price_change_term_{pred}'
-        df[label] = df['Close'].pct_change(periods=pred).shift(
-            periods=(-1 * pred))
-        columns.append(label)
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--symbols', type=str, help="Symbols to use separated by comma")
@@ -100,73 +99,396 @@ def main():
     parser.add_argument('--individual-files', type=bool, default=True, help="write each ticker separately")
     parser.add_argument('--pred', type=int, nargs="+", default=[7, 30, 120, 240],
                         help="A space separated list of prediction periods in days")
+    parser.add_argument('--labels', type=str, nargs="+", choices=list(LABEL_KINDS), default=["return"],
+                        help="labels to build for every prediction period, all horizons and kinds are computed in "
+                             "one pass (return)")
+    parser.add_argument('--features', type=str, nargs="+", default=feature_columns,
+                        help="Feature columns to build, only what they need is read and computed "
+                             "(default: alfred.data.feature_columns)")
     parser.add_argument('--debug', type=bool, default=True, help="write debug to console")
+    parser.add_argument('--storage', type=str, choices=['csv', 'parquet'], default='csv',
+                        help="file format for the output (csv)")
+    parser.add_argument('--manifest', type=str, default=None,
+                        help="Job manifest, with individual files symbols it records as merged are skipped on rerun")
+    parser.add_argument('--workers', type=int, default=1, help="processes to spread symbols across (1)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="most symbols submitted but not yet consumed, bounds memory (default: 2 x workers)")
+    parser.add_argument('--stream', action='store_true',
+                        help="without individual files, write a partitioned output chunk by chunk instead of one "
+                             "file built in memory")
+    parser.add_argument('--chunk-symbols', type=int, default=50, help="symbols per part with --stream (50)")
+    parser.add_argument('--cross-sectional', action='store_true',
+                        help="add features ranking each symbol against the whole list on every date")
+    parser.add_argument('--cs-horizons', type=int, nargs="+", default=[20, 60],
+                        help="return horizons for the cross-sectional features (20 60)")
+    parser.add_argument('--breadth-ma', type=int, default=50,
+                        help="moving average for the share of the list trading above it (50)")
+    parser.add_argument('--pairs', type=str, default=None,
+                        help="Main,Inverse pairs csv (lists/inverse_pairs.csv), adds spread, ratio, beta and "
+                             "correlation to the other leg to both legs of each pair")
+    parser.add_argument('--pair-windows', type=int, nargs="+", default=[20, 60],
+                        help="rolling windows for the pair features (20 60)")
+    parser.add_argument('--build-cache', type=str, default=None,
+                        help="Build cache, outputs whose inputs, parameters and code are unchanged are not rebuilt")
+    parser.add_argument('--force', action='store_true', help="rebuild everything even if the build cache is current")
 
     args = parser.parse_args()
     symbols = []
+    sectors = None
     if args.symbols:
         symbols = args.symbols.split(',')
     else:
-        symbols += pd.read_csv(args.symbol_file)["Symbols"].tolist()
+        symbol_list = pd.read_csv(args.symbol_file)
+        symbols += symbol_list["Symbols"].tolist()
+        if SECTOR_COLUMN in symbol_list.columns:
+            sectors = dict(zip(symbol_list["Symbols"], symbol_list[SECTOR_COLUMN].fillna("")))
+    symbols = [symbol for symbol in symbols if symbol != "^VIX"]
+
+    manifest = None
+    all_symbols = symbols
+    if args.manifest is not None:
+        manifest = JobManifest(args.manifest)
+        manifest.compact()
+        if args.individual_files:
+            symbols = manifest.pending(symbols, "merged")
+            print(f"Resuming: {len(all_symbols) - len(symbols)} of {len(all_symbols)} symbols already merged")
+
+    cross = None
+    if args.cross_sectional:
+        # always over the whole list, a resumed run still ranks against every symbol
+        start = time.monotonic()
+        cross = build_cross_section(args.data, all_symbols, args.cs_horizons, args.breadth_ma, sectors)
+        print(f"Cross section of {len(cross.symbols)} symbols x {len(cross.dates)} dates "
+              f"in {time.monotonic() - start:.2f}s")
+    pairs = None
+    if args.pairs is not None:
+        pairs = build_pair_features(args.data, load_pairs(args.pairs), args.pair_windows)
+        print(f"Pair features for {len(pairs.pairs)} pairs")
+        unpaired = [symbol for symbol in symbols if symbol not in pairs.leg_index]
+        if unpaired and not args.individual_files:
+            # every symbol of a single file needs the same columns
+            raise ValueError(f"Symbols not in any pair of {args.pairs}: {unpaired}")
+    set_run_data(load_macro_series(args.data), cross, pairs)
+
+    cache = None
+    keys = {}
+    if args.build_cache is not None:
+        cache = BuildCache(args.build_cache)
+        cache.compact()
+        if args.individual_files:
+            symbols, keys = stale_symbols(args, cache, symbols)
+        else:
+            key = cache.key([path for symbol in symbols for path in symbol_inputs(args, symbol)], build_params(args),
+                            code_files)
+            reason = "forced" if args.force else cache.stale_reason("processed", single_file_name(args), key)
+            if reason is None:
+                print(f"{single_file_path(args)} is up to date")
+                return
+            print(f"Rebuilding {os.path.basename(single_file_path(args))}: {reason}")
+
+    def on_error(symbol, error):
+        if cache is not None and args.individual_files:
+            cache.forget("unscaled", symbol)
+        if manifest is None:
+            raise error
+        # keep going, the failure is recorded and retried on the next run
+        print(f"Failed to process {symbol}: {error}")
+        manifest.record(symbol, "merged", False, error)
+
+    if not args.individual_files and args.stream:
+        output = stream_single_data_file(args, symbols, on_error)
+        if cache is not None:
+            cache.record("processed", single_file_name(args), key, [output])
+        return
 
     ticker_data_frames = []
-    for symbol in symbols:
-        if symbol == "^VIX":
+    for symbol, df, error in iter_symbol_results(args, symbols):
+        if error is not None:
+            on_error(symbol, error)
             continue
 
-        print("pre-processing: ", symbol)
-
-        df = read_file(args.data, f"{symbol}_fundamentals.csv")
-        assert (df is not None)
+        if args.individual_files:
+            if cache is not None:
+                cache.record("unscaled", symbol, keys[symbol], [output_path(args, symbol)])
+            if manifest is not None:
+                manifest.record(symbol, "merged", True)
+        else:
+            # prepare to merge all
+            ticker_data_frames.append(df)
 
-        # attach moving averages
-        df, columns = attach_moving_average_diffs(df)
+    if not args.individual_files:
+        output = finalize_single_data_file(args, ticker_data_frames)
+        if cache is not None:
+            cache.record("processed", single_file_name(args), key, [output])
+
+    if manifest is not None and args.individual_files:
+        manifest.print_summary("merged", all_symbols)
+
+
+def symbol_inputs(args, symbol):
+    # both the csv and columnar copy of every file a symbol is built from, readers use whichever is current
+    paths = [os.path.join(args.data, file) for file in
+             [f"{symbol}.csv", events_file(symbol), "^VIX.csv", "treasuries.csv"]]
+    if cross_section is not None:
+        # every symbol's features depend on the prices of the whole list
+        paths += [os.path.join(args.data, f"{other}.csv") for other in cross_section.symbols if other != symbol]
+    if pair_features is not None and symbol in pair_features.leg_index:
+        paths.append(os.path.join(args.data, f"{pair_features.partner(symbol)}.csv"))
+    return paths + [columnar_path(path) for path in paths]
+
+
+def build_params(args):
+    return {"pred": args.pred, "labels": args.labels, "features": args.features, "storage": args.storage,
+            "individual_files": bool(args.individual_files), "stream": args.stream,
+            "cross_sectional": {"horizons": args.cs_horizons, "breadth_ma": args.breadth_ma}
+            if args.cross_sectional else None,
+            "pairs": {"pairs": load_pairs(args.pairs), "windows": args.pair_windows}
+            if args.pairs else None}
+
+
+def output_path(args, symbol):
+    path = os.path.join(args.data, f"{symbol}_unscaled.csv")
+    return columnar_path(path) if args.storage == "parquet" else path
+
+
+def stale_symbols(args, cache, symbols):
+    '''
+    Splits symbols into the ones the build cache says need a rebuild, printing why for each, and returns them with
+    the build keys to record once they are done.
+    '''
+    stale = []
+    keys = {}
+    reasons = {}
+    params = build_params(args)
+    for symbol in symbols:
+        key = cache.key(symbol_inputs(args, symbol), params, code_files)
+        reason = "forced" if args.force else cache.stale_reason("unscaled", symbol, key)
+        if reason is None:
+            continue
+        print(f"Rebuilding {symbol}: {reason}")
+        stale.append(symbol)
+        keys[symbol] = key
+        kind = reason.split(":")[0]
+        reasons[kind] = reasons.get(kind, 0) + 1
+    details = ", ".join(f"{count} {kind}" for kind, count in reasons.items())
+    print(f"Build cache: {len(stale)} of {len(symbols)} symbols to rebuild"
+          f"{f' ({details})' if details else ''}, {len(symbols) - len(stale)} unchanged")
+    return stale, keys
+
+
+def build_symbol(args, symbol):
+    # runs in a worker process when --workers > 1. With individual files the worker writes the file itself so
+    # only a small result comes back, otherwise the frame is returned for the single file merge
+    try:
+        df = process_symbol(args, symbol)
+        if args.individual_files:
+            df = add_macro_series(df, feature_plan(args))
+            write_frame(unnamed_index(df), os.path.join(args.data, f"{symbol}_unscaled.csv"), args.storage)
+            return symbol, None, None
+        return symbol, df, None
+    except Exception as e:
+        return symbol, None, e
+
+
+def iter_symbol_results(args, symbols, work=None):
+    '''
+    Yields work(args, symbol)'s (symbol, result, error) in the same order as symbols regardless of which worker
+    finishes first, work defaults to build_symbol. At most
+    max_in_flight symbols are submitted ahead of the one being consumed, which bounds how many finished frames can
+    pile up waiting for a slow symbol.
+    '''
+    work = build_symbol if work is None else work
+    start = time.monotonic()
+    total = len(symbols)
+
+    def progress(i, symbol):
+        elapsed = time.monotonic() - start
+        print(f"[{i}/{total}] {symbol} done, {elapsed:.1f}s elapsed, {i / max(elapsed, 1e-9):.2f} symbols/s")
+
+    if args.workers <= 1:
+        for i, symbol in enumerate(symbols):
+            result = work(args, symbol)
+            progress(i + 1, symbol)
+            yield result
+    else:
+        max_in_flight = args.max_in_flight or 2 * args.workers
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=set_run_data,
+                                 initargs=(macro_series, cross_section, pair_features)) as pool:
+            pending = deque()
+            submitted = 0
+            for i in range(total):
+                while submitted < total and len(pending) < max_in_flight:
+                    pending.append(pool.submit(work, args, symbols[submitted]))
+                    submitted += 1
+                result = pending.popleft().result()
+                progress(i + 1, symbols[i])
+                yield result
 
-        # attach labels
-        attach_price_prediction_labels(args, columns, df)
+    elapsed = time.monotonic() - start
+    print(f"Processed {total} symbols in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.2f} symbols/s) "
+          f"with {args.workers} worker(s)")
 
-        # both of these functions will cause NaN to get introduced. We can't predict for labels we don't have with missing data, so we'll trim it all out
-        df.dropna(inplace=True)
 
-        min_date = df.index.min()
-        max_date = df.index.max()
-        print(f"Min date for {symbol}: {min_date}")
-        print(f"Max date for {symbol}: {max_date}")
+def feature_plan(args):
+    # requested features plus the requested labels for every prediction period
+    return plan_features(list(args.features) + [LABEL_KINDS[label].format(n=pred)
+                                                for label in args.labels for pred in args.pred])
 
-        df["Symbol"] = symbol
 
-        columns.extend(initial_columns_to_keep)
+def price_columns(plan):
+    # source columns that come from the price file, the rest are fundamentals or macro series
+    return [col for col in plan.sources if col not in FUNDAMENTAL_COLUMNS and col not in macro_series.columns]
 
-        # drop columns we don't want. We need columns untouched for later
-        df = df[columns]
 
-        # prepare to merge all
-        ticker_data_frames.append(df)
+def process_symbol(args, symbol):
+    print("pre-processing: ", symbol)
 
-    if not args.individual_files:
-        finalize_single_data_file(args, ticker_data_frames)
+    plan = feature_plan(args)
+    if any(col in FUNDAMENTAL_COLUMNS for col in plan.sources):
+        df = read_fundamentals(args.data, symbol, columns=price_columns(plan))
     else:
-        for frame, symbol in zip(ticker_data_frames, symbols):
-            frame = add_vix(frame, args)
-            frame = add_treasuries(frame, args)
-            new_file_path = os.path.join(args.data, f"{symbol}_unscaled.csv")
-            frame.to_csv(new_file_path)
+        df = read_symbol_file(args.data, symbol, columns=price_columns(plan))
+    assert (df is not None)
+
+    df = attach_features(plan, df, symbol)
+
+    min_date = df.index.min()
+    max_date = df.index.max()
+    print(f"Min date for {symbol}: {min_date}")
+    print(f"Max date for {symbol}: {max_date}")
+
+    df["Symbol"] = symbol
+
+    # computed columns first, then the symbol and the source columns kept as they are
+    columns = plan.computed + ([] if cross_section is None else cross_section.columns)
+    if pair_features is not None and symbol in pair_features.leg_index:
+        columns += pair_features.columns
+    columns += ["Symbol"] + [col for col in initial_columns_to_keep if col in plan.sources]
+    columns += [col for col in plan.sources if col not in columns and col not in macro_series.columns]
+
+    # drop columns we don't want. We need columns untouched for later
+    return df[columns]
+
+
+def attach_features(plan, df, symbol):
+    # only the columns the plan needs are computed, intermediates shared between features are computed once
+    df = plan.compute(df)
+    if cross_section is not None:
+        cross_section.attach(df, symbol)
+    if pair_features is not None and symbol in pair_features.leg_index:
+        pair_features.attach(df, symbol)
+
+    # moving averages and labels introduce NaN. We can't predict for labels we don't have with missing data, so we'll trim it all out
+    df.dropna(inplace=True)
+    return df
+
+
+def spill_symbol(args, symbol):
+    '''
+    First pass of the streaming build: processes a symbol and joins it to the macro series, the only time it is, and
+    spills the frame to a scratch file for the second pass. Returns the first and last date it has, so the aligned
+    start date is known before anything is written.
+    '''
+    try:
+        _, df, error = build_symbol(args, symbol)
+        if error is not None:
+            raise error
+        df = add_macro_series(df, feature_plan(args))
+        if df.empty:
+            raise ValueError(f"{symbol} has no rows left after processing")
+        # pickled, a scratch file has to read back exactly as it was and csv doesn't round trip floats
+        df.to_pickle(os.path.join(spill_path(args), f"{symbol}.pkl"))
+        return symbol, (df.index.min(), df.index.max()), None
+    except Exception as e:
+        return symbol, None, e
+
+
+def spill_path(args):
+    return os.path.join(partitioned_path(args), ".symbols")
+
+
+def stream_single_data_file(args, symbols, on_error):
+    '''
+    Single file build that never holds more than a chunk of symbols. A first pass processes every symbol once,
+    spilling each to a scratch file, and finds the aligned date range (the latest first date of any symbol, as
+    align_date_range would). The second reads the spilled symbols back, trims them to that start and writes them
+    chunk_symbols at a time as parts of a partitioned output, one directory with an index.json listing the parts.
+    Symbols are written in sorted order so the parts read back in the same layout as the single file.
+    '''
+    symbols = sorted(symbols)
+    out_dir = partitioned_path(args)
+    os.makedirs(spill_path(args), exist_ok=True)
+    date_ranges = {}
+    for symbol, date_range, error in iter_symbol_results(args, symbols, spill_symbol):
+        if error is not None:
+            on_error(symbol, error)
+            continue
+        date_ranges[symbol] = date_range
+    if not date_ranges:
+        raise ValueError("No symbols left to build")
+    symbols = [symbol for symbol in symbols if symbol in date_ranges]
+    limited_by = max(symbols, key=lambda symbol: date_ranges[symbol][0])
+    start_date = date_ranges[limited_by][0]
+    end_date = max(date_range[1] for date_range in date_ranges.values())
+    print(f"Final Date Range: {start_date} to {end_date} limited by: {limited_by}")
+
+    parts = []
+    chunk = []
+
+    def write_chunk():
+        chunk_df = pd.concat(chunk)
+        chunk_df.index.name = "Date"
+        assert not chunk_df.isnull().any().any(), f"unscaled df has null after transform"
+        path = os.path.join(out_dir, f"part-{len(parts):05d}.csv")
+        parts.append(os.path.basename(write_frame(chunk_df, path, args.storage)))
+        chunk.clear()
+
+    written = []
+    for symbol in symbols:
+        df = pd.read_pickle(os.path.join(spill_path(args), f"{symbol}.pkl"))
+        chunk.append(df[df.index >= start_date])
+        written.append(symbol)
+        if len(chunk) >= args.chunk_symbols:
+            write_chunk()
+    if chunk:
+        write_chunk()
+    shutil.rmtree(spill_path(args))
+
+    index_path = os.path.join(out_dir, PARTITION_INDEX)
+    with open(index_path, "w") as f:
+        json.dump({"version": PARTITION_VERSION, "parts": parts, "symbols": written,
+                   "start": str(start_date), "end": str(end_date)}, f)
+    print(f"Wrote {len(written)} symbols in {len(parts)} parts to {out_dir}")
+    return index_path
+
 
 def finalize_single_data_file(args, ticker_data_frames):
     final_df = pd.concat(ticker_data_frames)
-    final_df = add_vix(final_df, args)
-    final_df = add_treasuries(final_df, args)
+    final_df = add_macro_series(final_df, feature_plan(args))
+
+    # grouped by symbol, dates ascending within each
+    final_df = final_df.sort_index(kind='mergesort').sort_values(by='Symbol', kind='mergesort')
 
     final_df, _, _ = align_date_range(final_df)
 
     assert not final_df.isnull().any().any(), f"unscaled df has null after transform"
 
     # save unscaled interim path
+    return write_frame(unnamed_index(final_df), single_file_path(args), args.storage)
+
+
+def single_file_name(args):
     base_name = os.path.basename(args.symbol_file)
     file_name, file_extension = os.path.splitext(base_name)
-    new_file_name = f"{file_name}_processed_unscaled{file_extension}"
-    new_file_path = os.path.join(args.data, new_file_name)
-    final_df.to_csv(new_file_path)
+    return f"{file_name}_processed_unscaled{file_extension}"
+
+
+def single_file_path(args):
+    return os.path.join(args.data, single_file_name(args))
+
+
+def partitioned_path(args):
+    return os.path.join(args.data, os.path.splitext(single_file_name(args))[0])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Fits one CustomScaler across every symbol of a list instead of one per file. Files are read and partial_fit one at
+# a time so memory stays bounded by the largest file, with --workers each worker fits a share of the files and the
+# partial scalers are merged. The result loads with CustomScaler.load and is passed to the data sets as scaler=. With
+# --artifact the fitted parameters are also written as a .npz that scoring loads with
+# alfred.utils.scaler_artifact.load_artifact, no pickled estimators.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from alfred.data import read_path
+from alfred.data.readers import PARTITION_INDEX
+from alfred.utils import CustomScaler
+
+# same scaling as the training scripts use
+default_scaler_config = [
+    {'regex': r'^Close$', 'type': 'log_returns'},
+    {'regex': r'^VIX.*', 'type': 'standard'},
+    {'regex': r'^Margin.*', 'type': 'standard'},
+    {'regex': r'^Volume$', 'type': 'log_returns'},
+    {'columns': ['reportedEPS', 'estimatedEPS', 'surprise', 'surprisePercentage'], 'type': 'standard'},
+    {'regex': r'\d+year', 'type': 'standard'}
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=str, help="Symbols to use separated by comma")
+    parser.add_argument('--symbol-file', type=str, help="List of symbols in a file")
+    parser.add_argument('--data', type=str, default="./data", help="data dir with the {symbol}_unscaled files (./data)")
+    parser.add_argument('--partitioned', type=str, default=None,
+                        help="fit on the parts of a partitioned output (create-final-data-set --stream) instead")
+    parser.add_argument('--config', type=str, default=None, help="scaler config json (default: the training config)")
+    parser.add_argument('--start', type=str, default=None, help="first date to fit on, the training period")
+    parser.add_argument('--end', type=str, default=None, help="last date to fit on")
+    parser.add_argument('--workers', type=int, default=1, help="processes to spread files across (1)")
+    parser.add_argument('--out', type=str, default="./data/scaler.joblib", help="output (./data/scaler.joblib)")
+    parser.add_argument('--artifact', type=str, default=None, help="also write the compact .npz artifact here")
+    args = parser.parse_args()
+
+    if args.partitioned is not None:
+        with open(os.path.join(args.partitioned, PARTITION_INDEX)) as f:
+            paths = [os.path.join(args.partitioned, part) for part in json.load(f)["parts"]]
+        date_column = "Date"
+    else:
+        symbols = args.symbols.split(',') if args.symbols else pd.read_csv(args.symbol_file)["Symbols"].tolist()
+        paths = [os.path.join(args.data, f"{symbol}_unscaled.csv") for symbol in symbols]
+        date_column = "Unnamed: 0"
+    config = default_scaler_config
+    if args.config is not None:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    start = time.monotonic()
+    shares = [paths[i::args.workers] for i in range(args.workers)]
+    jobs = [(share, config, date_column, args.start, args.end) for share in shares if share]
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            partials = list(pool.map(fit_share, jobs))
+    else:
+        partials = [fit_share(job) for job in jobs]
+
+    scaler = partials[0]
+    for partial in partials[1:]:
+        scaler.merge(partial)
+    scaler.serialize(args.out)
+    print(f"Fitted {len(scaler.column_types)} columns on {len(paths)} files in {time.monotonic() - start:.2f}s, "
+          f"wrote {args.out}")
+    if args.artifact is not None:
+        scaler.export(args.artifact)
+        print(f"Wrote {args.artifact}")
+
+
+def fit_share(job):
+    paths, config, date_column, start, end = job
+    scaler = None
+    for path in paths:
+        if scaler is None:
+            # regex entries are resolved against the first file's columns, every file has the same ones
+            df = read_path(path, fail_on_missing=True, start=start, end=end, date_column=date_column)
+            scaler = CustomScaler(config, df, grouped=True)
+        else:
+            df = read_path(path, fail_on_missing=True, columns=list(scaler.column_types), start=start, end=end,
+                           date_column=date_column)
+        if len(df) > 0:
+            scaler.partial_fit(df)
+    return scaler
+
+
+if __name__ == "__main__":
+    main()
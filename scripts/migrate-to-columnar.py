@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# One shot conversion of the csv data cache to columnar (parquet) files. Each {name}.csv gets a {name}.parquet next
+# to it with the date index stored as "Date". read_file/read_symbol_file/read_processed_file prefer the columnar copy
+# as long as it is at least as new as the csv, so the csv can be kept around (the incremental price refresh
+# appends to it) or removed with --delete-csv.
+import argparse
+import glob
+import os
+import time
+
+import pandas as pd
+
+from alfred.data.readers import write_frame, columnar_path
+
+# the cache uses a few different names for its date column
+DATE_COLUMNS = ["Date", "date", "Unnamed: 0"]
+
+
+def migrate_file(path, delete_csv=False):
+    header = pd.read_csv(path, nrows=0).columns
+    date_column = next((col for col in DATE_COLUMNS if col in header), None)
+    if date_column is None:
+        print(f"Skipping {path}, no date column")
+        return False
+    df = pd.read_csv(path)
+    df[date_column] = pd.to_datetime(df[date_column])
+    df = df.set_index(date_column)
+    write_frame(df, path, storage="parquet")
+    if delete_csv:
+        os.remove(path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert cached csv data files to columnar files")
+    parser.add_argument("--data", type=str, default="./data", help="data dir (./data)")
+    parser.add_argument("--pattern", type=str, default="*.csv", help="files to convert (default: *.csv)")
+    parser.add_argument("--delete-csv", action="store_true", help="remove each csv once it has been converted")
+    parser.add_argument("--force", action="store_true", help="convert even when the columnar copy is current")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.data, args.pattern)))
+    converted = 0
+    csv_bytes = 0
+    columnar_bytes = 0
+    start = time.monotonic()
+    for path in paths:
+        columnar = columnar_path(path)
+        if not args.force and os.path.exists(columnar) and os.path.getmtime(columnar) >= os.path.getmtime(path):
+            continue
+        size = os.path.getsize(path)
+        try:
+            ok = migrate_file(path, args.delete_csv)
+        except (pd.errors.ParserError, ValueError) as e:
+            print(f"Failed to convert {path}: {e}")
+            continue
+        if ok:
+            converted += 1
+            csv_bytes += size
+            columnar_bytes += os.path.getsize(columnar)
+    elapsed = time.monotonic() - start
+    print(f"Converted {converted} of {len(paths)} files in {elapsed:.2f}s, "
+          f"{csv_bytes / 1e6:.1f}MB csv -> {columnar_bytes / 1e6:.1f}MB columnar")
+
+
+if __name__ == "__main__":
+    main()
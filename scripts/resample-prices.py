@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from alfred.data import resample_symbols, write_frame
+from alfred.data.resample import INTERVALS
+
+parser = argparse.ArgumentParser(
+    description="Derive weekly or monthly bars from the cached daily prices instead of downloading them again")
+parser.add_argument("-s", "--symbols", help="Symbols to use, separated by comma")
+parser.add_argument("-f", "--symbol-file", help="Load symbols from a file")
+parser.add_argument("-i", "--interval", choices=INTERVALS, default="1wk", help="Bar size to resample to (1wk)")
+parser.add_argument("-d", "--data", default="./data", help="Directory with the daily {symbol}.csv files (./data)")
+parser.add_argument("-o", "--output-dir", default=None,
+                    help="Output directory, same {symbol}.csv layout as the daily files (default: data/{interval})")
+parser.add_argument("--storage", type=str, choices=['csv', 'parquet'], default='csv',
+                    help="file format for the output (csv)")
+parser.add_argument("--max-rows-per-chunk", type=int, default=2_000_000,
+                    help="Most daily rows read and resampled at once (2000000)")
+
+args = parser.parse_args()
+
+symbols = []
+if args.symbols is not None:
+    symbols += args.symbols.split(',')
+if args.symbol_file is not None:
+    symbols += pd.read_csv(args.symbol_file)["Symbols"].tolist()
+symbols = list(dict.fromkeys(symbols))
+
+output_dir = args.output_dir if args.output_dir is not None else os.path.join(args.data, args.interval)
+os.makedirs(output_dir, exist_ok=True)
+
+start = time.monotonic()
+resampled = set()
+for symbol, df in resample_symbols(args.data, symbols, args.interval, args.max_rows_per_chunk):
+    write_frame(df, os.path.join(output_dir, f"{symbol}.csv"), args.storage)
+    resampled.add(symbol)
+
+missing = [symbol for symbol in symbols if symbol not in resampled]
+if missing:
+    print(f"No daily prices for: {', '.join(missing)}")
+print(f"Resampled {len(resampled)} symbols to {args.interval} in {time.monotonic() - start:.2f}s, wrote {output_dir}")
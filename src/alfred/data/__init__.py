@@ -1,5 +1,18 @@
-from .downloaders import download_ticker_list, AlphaDownloader
-from .readers import read_processed_file, read_symbol_file, read_file
-from .processors import attach_moving_average_diffs, scale_relevant_training_columns
-from .data_sources import YahooNextCloseWindowDataSet, CachedStockDataSet
+from .downloaders import download_ticker_list, bulk_download_ticker_list, AlphaDownloader
+from .manifest import JobManifest
+from .build_cache import BuildCache
+from .http_cache import ResponseCache
+from .async_downloaders import AsyncAlphaFetcher, fetch_fundamentals, fetch_treasury_yields
+from .readers import read_processed_file, read_symbol_file, read_file, read_path, read_partitioned, write_frame
+from .processors import attach_moving_average_diffs, attach_panel_moving_average_diffs, scale_relevant_training_columns
+from .feature_graph import feature, plan_features, FeaturePlan
+from . import indicators, labels
+from .cross_section import build_cross_section, CrossSection
+from .pairs import build_pair_features, load_pairs, PairFeatures
+from .resample import resample_bars, resample_symbols
+from .macro import load_macro_series, asof_join
+from .fundamentals import build_event_table, write_event_table, read_event_table, read_fundamentals
+from .online_features import OnlineFeatureState
+from .panel import build_panel, Panel
+from .data_sources import YahooNextCloseWindowDataSet, CachedStockDataSet, CachedPanelDataSet
 from .features_and_labels import feature_columns, label_columns
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from .downloaders import AlphaDownloader
+
+
+class AsyncQuota:
+    '''
+    Spaces requests evenly so we never go over requests_per_minute, alpha vantage counts per minute.
+    '''
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AsyncAlphaFetcher:
+    '''
+    Asyncio front end for AlphaDownloader. Requests for many symbols (and treasury maturities) are in flight at
+    once, limited by the quota and max_concurrency. The blocking http calls and the pandas side of parsing
+    (margins etc) run on worker threads so that work overlaps with requests still waiting on the network.
+
+    Cache hits from the downloader's response cache don't spend quota.
+    '''
+
+    def __init__(self, alpha: AlphaDownloader, requests_per_minute=75, max_concurrency=8):
+        self.alpha = alpha
+        self.quota = AsyncQuota(requests_per_minute)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.requests = 0
+
+    async def query(self, function, cache_key, expected_key, verify=True, **params):
+        data = self.alpha.cached(function, cache_key)
+        if data is not None:
+            return data
+        async with self.semaphore:
+            await self.quota.acquire()
+            self.requests += 1
+            return await asyncio.to_thread(self.alpha.fetch, function, cache_key, expected_key, verify, **params)
+
+    async def earnings(self, symbol):
+        data = await self.query('EARNINGS', symbol, 'quarterlyEarnings', verify=False, symbol=symbol)
+        return await asyncio.to_thread(AlphaDownloader.parse_earnings, data)
+
+    async def margins(self, symbol):
+        data = await self.query('INCOME_STATEMENT', symbol, 'quarterlyReports', symbol=symbol)
+        return await asyncio.to_thread(AlphaDownloader.parse_margins, data)
+
+    async def fundamentals(self, symbol):
+        (_, quarterly_earnings), margins = await asyncio.gather(self.earnings(symbol), self.margins(symbol))
+        return quarterly_earnings, margins
+
+    async def treasury_yields(self, maturities=['10year', '5year', '3year', '2year']):
+        async def maturity_frame(maturity):
+            data = await self.query('TREASURY_YIELD', f'{maturity}_monthly', 'data', interval='monthly',
+                                    maturity=maturity)
+            return await asyncio.to_thread(AlphaDownloader.parse_treasury, data, maturity)
+
+        frames = await asyncio.gather(*[maturity_frame(maturity) for maturity in maturities])
+        return AlphaDownloader.join_yields(frames)
+
+    async def stream_fundamentals(self, symbols, on_result):
+        '''
+        Fetches fundamentals for every symbol and hands each one to on_result(symbol, quarterly_earnings, margins,
+        error) as soon as it completes, in completion order. on_result runs on a worker thread so merging and
+        writing to disk doesn't hold up the event loop.
+        '''
+
+        async def one(symbol):
+            try:
+                quarterly_earnings, margins = await self.fundamentals(symbol)
+            except Exception as e:
+                return symbol, None, None, e
+            return symbol, quarterly_earnings, margins, None
+
+        tasks = [asyncio.create_task(one(symbol)) for symbol in symbols]
+        for next_done in asyncio.as_completed(tasks):
+            symbol, quarterly_earnings, margins, error = await next_done
+            await asyncio.to_thread(on_result, symbol, quarterly_earnings, margins, error)
+
+
+def fetch_fundamentals(alpha, symbols, on_result, requests_per_minute=75, max_concurrency=8):
+    # sync entry point for scripts
+    async def run():
+        fetcher = AsyncAlphaFetcher(alpha, requests_per_minute, max_concurrency)
+        await fetcher.stream_fundamentals(symbols, on_result)
+        return fetcher.requests
+
+    return asyncio.run(run())
+
+
+def fetch_treasury_yields(alpha, maturities=['10year', '5year', '3year', '2year'], requests_per_minute=75):
+    async def run():
+        return await AsyncAlphaFetcher(alpha, requests_per_minute).treasury_yields(maturities)
+
+    return asyncio.run(run())
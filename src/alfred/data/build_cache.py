@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_params(params):
+    # json with sorted keys so the same parameters always hash the same
+    return hash_bytes(json.dumps(params, sort_keys=True, default=str).encode())
+
+
+class BuildCache:
+    '''
+    Make-like record of what each build step (a stage for one symbol, or one output for a whole list) was last built
+    from. A step's key is the content hash of its input files, a hash of its parameters and a hash of the code that
+    builds it. A step is skipped when its key matches the recorded one and its outputs still exist, otherwise
+    stale_reason says why it has to be rebuilt.
+
+    File hashes are remembered with the size and mtime they were taken at, so unchanged inputs are not re-read on
+    every run. Like JobManifest the file is a json lines log that loading replays, compact() rewrites it.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = {}
+        self.fingerprints = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "file" in entry:
+                    self.fingerprints[entry["file"]] = entry["fingerprint"]
+                else:
+                    self.steps[(entry["stage"], entry["name"])] = entry["step"]
+
+    def _append(self, entries):
+        with open(self.path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+
+    def hash_file(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            fingerprint = self.fingerprints.get(path)
+        if fingerprint is not None and fingerprint[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return fingerprint[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        with self._lock:
+            self.fingerprints[path] = fingerprint
+            self._append([{"file": path, "fingerprint": fingerprint}])
+        return fingerprint[2]
+
+    def hash_code(self, paths):
+        return hash_bytes("".join(self.hash_file(path) for path in sorted(paths)).encode())
+
+    def key(self, inputs, params, code_paths):
+        '''
+        The build key for a step. Inputs that don't exist hash as missing, so one appearing later triggers a rebuild.
+        '''
+        return {"inputs": {path: self.hash_file(path) if os.path.exists(path) else None for path in sorted(inputs)},
+                "params": hash_params(params),
+                "code": self.hash_code(code_paths)}
+
+    def stale_reason(self, stage, name, key):
+        # None when the step is up to date
+        with self._lock:
+            step = self.steps.get((stage, name))
+        if step is None:
+            return "never built"
+        missing = [path for path in step["outputs"] if not os.path.exists(path)]
+        if missing:
+            return f"output missing: {', '.join(os.path.basename(path) for path in missing)}"
+        changed = [path for path in sorted(set(key["inputs"]) | set(step["key"]["inputs"]))
+                   if key["inputs"].get(path) != step["key"]["inputs"].get(path)]
+        if changed:
+            return f"inputs changed: {', '.join(os.path.basename(path) for path in changed)}"
+        if key["params"] != step["key"]["params"]:
+            return "parameters changed"
+        if key["code"] != step["key"]["code"]:
+            return "code changed"
+        return None
+
+    def record(self, stage, name, key, outputs):
+        step = {"key": key, "outputs": list(outputs)}
+        with self._lock:
+            self.steps[(stage, name)] = step
+            self._append([{"stage": stage, "name": name, "step": step}])
+
+    def forget(self, stage, name):
+        # a failed rebuild may have left a partial output, make sure the next run tries again
+        with self._lock:
+            if (stage, name) in self.steps:
+                del self.steps[(stage, name)]
+                self._append([{"stage": stage, "name": name, "step": None}])
+
+    def compact(self):
+        # rewrites the log with one line per step and per file still referenced
+        with self._lock:
+            steps = {key: step for key, step in self.steps.items() if step is not None}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for path, fingerprint in self.fingerprints.items():
+                    if os.path.exists(path):
+                        f.write(json.dumps({"file": path, "fingerprint": fingerprint}) + "\n")
+                for (stage, name), step in steps.items():
+                    f.write(json.dumps({"stage": stage, "name": name, "step": step}) + "\n")
+            os.replace(tmp_path, self.path)
+            self.steps = steps
@@ -0,0 +1,179 @@
+import numpy as np
+
+from .readers import read_symbol_file
+
+# the symbol list column cross-sectional features take sectors from, when the list has one
+SECTOR_COLUMN = "Sector"
+
+
+def percentile_rank(x):
+    '''
+    Percentile rank of each value among the non-NaN values of its row (date) of a [date, symbol] array, ties get
+    their average rank: DataFrame.rank(axis=1, pct=True). NaNs stay NaN.
+    '''
+    rows, cols = x.shape
+    order = np.argsort(x, axis=1, kind="stable")  # NaNs sort last
+    ordered = np.take_along_axis(x, order, axis=1)
+    valid = np.count_nonzero(~np.isnan(x), axis=1)
+    positions = np.broadcast_to(np.arange(cols), (rows, cols))
+
+    # first and last position of each run of tied values, their average is the tied rank
+    new_run = np.ones((rows, cols), dtype=bool)
+    new_run[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    first = np.maximum.accumulate(np.where(new_run, positions, 0), axis=1)
+    run_end = np.ones((rows, cols), dtype=bool)
+    run_end[:, :-1] = new_run[:, 1:]
+    last = np.minimum.accumulate(np.where(run_end, positions, cols - 1)[:, ::-1], axis=1)[:, ::-1]
+
+    ranked = np.empty((rows, cols))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.put_along_axis(ranked, order, ((first + last) / 2 + 1) / valid[:, None], axis=1)
+    ranked[np.isnan(x)] = np.nan
+    return ranked
+
+
+def row_moments(x):
+    # mean and (population) standard deviation of the non-NaN values in each row, NaN for an empty row
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=1, keepdims=True)
+    filled = np.where(valid, x, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = filled.sum(axis=1, keepdims=True) / count
+        std = np.sqrt(np.where(valid, (x - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / count)
+    return mean, std
+
+
+def zscore(x):
+    # z-score of each value against its row (the universe that date), 0 where the row has no spread (a single
+    # symbol, or every return equal) so only missing values are NaN
+    mean, std = row_moments(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(np.isnan(x), np.nan, np.where(std > 0, (x - mean) / std, 0.0))
+
+
+def demean_by_group(x, groups):
+    '''
+    Subtracts from each value the mean of its group (sector) on the same row, over the non-NaN values. groups has
+    one integer code per column.
+    '''
+    groups = np.asarray(groups)
+    one_hot = (groups[:, None] == np.arange(groups.max() + 1)[None, :]).astype(np.float64)
+    valid = ~np.isnan(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (np.where(valid, x, 0.0) @ one_hot) / (valid.astype(np.float64) @ one_hot)
+    return x - means[:, groups]
+
+
+def breadth(flags, valid):
+    # fraction of the symbols with a value that date that are flagged, broadcast back to every symbol
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = (flags & valid).sum(axis=1, keepdims=True) / valid.sum(axis=1, keepdims=True)
+    return np.where(valid, fraction, np.nan)
+
+
+def forward_fill(x):
+    # last known value of each column, leading NaNs stay NaN
+    positions = np.where(~np.isnan(x), np.arange(len(x))[:, None], 0)
+    return np.take_along_axis(x, np.maximum.accumulate(positions, axis=0), axis=0)
+
+
+def trailing_mean(x, n):
+    # rolling(n).mean() down each column, NaN until a full window without NaNs
+    out = np.full(x.shape, np.nan)
+    if n > len(x):
+        return out
+    valid = ~np.isnan(x)
+    sums = np.zeros((len(x) + 1, x.shape[1]))
+    np.cumsum(np.where(valid, x, 0.0), axis=0, out=sums[1:])
+    counts = np.zeros((len(x) + 1, x.shape[1]), dtype=np.int64)
+    np.cumsum(valid, axis=0, out=counts[1:])
+    full = (counts[n:] - counts[:-n]) == n
+    out[n - 1:] = np.where(full, (sums[n:] - sums[:-n]) / n, np.nan)
+    return out
+
+
+def load_close_matrix(data_path_, symbols):
+    '''
+    Every symbol's Close on one calendar, the union of their dates: ([date], [symbol], [date, symbol] array) with
+    NaN where a symbol has no bar. Symbols without a price file are left out.
+    '''
+    closes = {}
+    for symbol in symbols:
+        df = read_symbol_file(data_path_, symbol, columns=["Close"])
+        if df is not None:
+            closes[symbol] = df["Close"]
+    if not closes:
+        raise ValueError("No price files found for the cross section")
+    dates = np.unique(np.concatenate([close.index.values.astype("datetime64[ns]") for close in closes.values()]))
+    matrix = np.full((len(dates), len(closes)), np.nan)
+    for j, close in enumerate(closes.values()):
+        matrix[np.searchsorted(dates, close.index.values.astype("datetime64[ns]")), j] = close.to_numpy(np.float64)
+    return dates, list(closes.keys()), matrix
+
+
+class CrossSection:
+    '''
+    Per date features of each symbol relative to the rest of the universe, computed on a dense [date, symbol]
+    Close matrix. For every horizon n:
+
+        Return_{n}                 n bar return
+        CS_rank_return_{n}         percentile rank of that return across the universe
+        CS_zscore_return_{n}       z-score of that return against the universe, 0 when they are all equal
+        CS_sector_momentum_{n}     return minus the mean return of the symbol's sector
+
+    plus the universe wide Breadth_advancing (fraction of symbols up on the day) and Breadth_above_MA_{ma}
+    (fraction trading above their ma bar moving average). Everything only looks back. Without sectors every symbol
+    is in one sector, so the sector momentum is the return less the universe mean.
+    '''
+
+    def __init__(self, dates, symbols, close, horizons=[20, 60], ma=50, sectors=None):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.features = {}
+
+        present = ~np.isnan(close)
+        filled = forward_fill(close)
+        if sectors is None:
+            codes = np.zeros(len(self.symbols), dtype=np.int64)
+        else:
+            names = [sectors.get(symbol, "") for symbol in self.symbols]
+            _, codes = np.unique(names, return_inverse=True)
+
+        def returns(n):
+            change = np.full(close.shape, np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change[n:] = filled[n:] / filled[:-n] - 1
+            # only on the symbol's own bars, a stale price isn't a return
+            return np.where(present, change, np.nan)
+
+        for n in horizons:
+            change = returns(n)
+            self.features[f"Return_{n}"] = change
+            self.features[f"CS_rank_return_{n}"] = percentile_rank(change)
+            self.features[f"CS_zscore_return_{n}"] = zscore(change)
+            self.features[f"CS_sector_momentum_{n}"] = demean_by_group(change, codes)
+
+        daily = returns(1)
+        self.features["Breadth_advancing"] = breadth(daily > 0, ~np.isnan(daily))
+        moving_average = trailing_mean(filled, ma)
+        self.features[f"Breadth_above_MA_{ma}"] = breadth(filled > moving_average, present & ~np.isnan(moving_average))
+
+    @property
+    def columns(self):
+        return list(self.features.keys())
+
+    def attach(self, df, symbol):
+        # adds the symbol's cross-sectional columns to its date indexed frame, in place
+        j = self.symbol_index[symbol]
+        rows = np.searchsorted(self.dates, df.index.values.astype("datetime64[ns]"))
+        rows = np.minimum(rows, len(self.dates) - 1)
+        matched = self.dates[rows] == df.index.values.astype("datetime64[ns]")
+        for name, values in self.features.items():
+            df[name] = np.where(matched, values[rows, j], np.nan)
+        return df
+
+
+def build_cross_section(data_path_, symbols, horizons=[20, 60], ma=50, sectors=None):
+    dates, present, close = load_close_matrix(data_path_, symbols)
+    return CrossSection(dates, present, close, horizons, ma, sectors)
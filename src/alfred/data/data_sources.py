@@ -8,25 +8,32 @@ import yfinance as yf
 from sklearn.preprocessing import MinMaxScaler
 from alfred.utils.custom_scaler import LogReturnScaler
 from alfred.utils import CustomScaler
+from .readers import read_path, date_bounds, has_current_columnar
+from .panel import Panel
 
 # added this flag to go live (yahoo) or cache (file) due to network issues
 LIVE = false
 TICKER = "AAPL"
 
-def filter_by_date_range(df, start_date, end_date):
-    # Ensure the index is a DatetimeIndex
-    if not isinstance(df.index, pd.DatetimeIndex):
-        raise ValueError("The DataFrame index must be a DatetimeIndex.")
-
+def check_date_range(min_date, max_date, start_date, end_date):
     # Convert start_date and end_date to pd.Timestamp for comparison
     start = pd.Timestamp(start_date)
     end = pd.Timestamp(end_date)
 
     # Check if the start and end dates are within the DataFrame's index range
-    if not (start in df.index or df.index.min() <= start <= df.index.max()):
+    if not (min_date <= start <= max_date):
         raise ValueError(f"Start date {start_date} is out of range.")
-    if not (end in df.index or df.index.min() <= end <= df.index.max()):
+    if not (min_date <= end <= max_date):
         raise ValueError(f"End date {end_date} is out of range.")
+    return start, end
+
+
+def filter_by_date_range(df, start_date, end_date):
+    # Ensure the index is a DatetimeIndex
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("The DataFrame index must be a DatetimeIndex.")
+
+    start, end = check_date_range(df.index.min(), df.index.max(), start_date, end_date)
 
     # Filter the DataFrame within the date range
     filtered_df = df.loc[start:end]
@@ -89,15 +96,32 @@ class YahooNextCloseWindowDataSet(Dataset):
 
 class CachedStockDataSet(Dataset):
     def __init__(self, file, start, end, sequence_length, feature_columns, target_columns, scaler_config, change=1,
-                 date_column="Unnamed: 0"):
-        df = pd.read_csv(file)
-        df[date_column] = pd.to_datetime(df[date_column])
-        df = df.set_index(date_column)
-
-        self.orig_df = filter_by_date_range(df=df, start_date=start, end_date=end)
-        # continue scaling
-        self.scaler = CustomScaler(scaler_config, self.orig_df)
-        self.df = self.scaler.fit_transform(self.orig_df)
+                 date_column="Unnamed: 0", scaler=None):
+        # only read the columns we use (plus any the scaler config names explicitly) and only the requested dates,
+        # with a columnar copy of the file both are pushed down into the reader
+        scaled_columns = list(scaler.column_types) if scaler is not None else \
+            [col for entry in scaler_config for col in entry.get('columns', [])]
+        columns = list(dict.fromkeys(list(feature_columns) + list(target_columns) + scaled_columns))
+        if has_current_columnar(file):
+            # the bounds come from the parquet footer, the date filter is pushed down into the read
+            check_date_range(*date_bounds(file, date_column), start, end)
+            self.orig_df = read_path(file, fail_on_missing=True, columns=columns, start=start, end=end,
+                                     date_column=date_column)
+        else:
+            # a csv's dates are all parsed by the read anyway, check the range on them rather than parse twice
+            df = read_path(file, fail_on_missing=True, columns=columns, date_column=date_column)
+            check_date_range(df.index.min(), df.index.max(), start, end)
+            self.orig_df = df[(df.index >= pd.Timestamp(start)) & (df.index <= pd.Timestamp(end))]
+        if self.orig_df.empty:
+            raise ValueError(f"No data available between {start} and {end}.")
+        # continue scaling, with the scaler given (fitted across the whole universe, see scripts/fit-scaler.py) or
+        # one fitted on this file
+        if scaler is not None:
+            self.scaler = scaler
+            self.df = self.scaler.transform(self.orig_df)
+        else:
+            self.scaler = CustomScaler(scaler_config, self.orig_df, grouped=True)
+            self.df = self.scaler.fit_transform(self.orig_df)
         assert not self.df.isnull().any().any(), f"scaled df has null after transform"
 
         self.seq_length = sequence_length
@@ -118,4 +142,57 @@ class CachedStockDataSet(Dataset):
     def __getitem__(self, index):
         x = self.x[index]  # Get the input sequence
         y = self.y[index]  # Get the target value
-        return torch.tensor(x, dtype=torch.float32), torch.tensor(y, dtype=torch.float32)
\ No newline at end of file
+        return torch.tensor(x, dtype=torch.float32), torch.tensor(y, dtype=torch.float32)
+
+class CachedPanelDataSet(Dataset):
+    '''
+    Same windows as CachedStockDataSet but read from a memory mapped Panel (see build_panel) instead of parsing a csv.
+    Without a scaler_config windows are gathered straight from the mmap on each __getitem__, nothing is loaded up
+    front. With one, the symbol's rows are copied out and scaled the same way CachedStockDataSet does it, or with an
+    already fitted scaler (one fitted across the universe, see scripts/fit-scaler.py) they are only transformed.
+    '''
+
+    def __init__(self, panel, symbol, start, end, sequence_length, feature_columns, target_columns, scaler_config=None,
+                 change=1, scaler=None):
+        self.panel = Panel(panel) if isinstance(panel, str) else panel
+        self.seq_length = sequence_length
+        self.change = change
+        self.rows = self.panel.symbol_rows(symbol, start, end)
+        if len(self.rows) == 0:
+            raise ValueError(f"No data available between {start} and {end}.")
+
+        self.scaler = None
+        if scaler_config is None and scaler is None:
+            self.values = self.panel.values[self.panel.get_symbol(symbol)]
+            self.feature_index = self.panel.get_features(feature_columns)
+            self.target_index = self.panel.get_features(target_columns)
+        else:
+            columns = list(dict.fromkeys(list(feature_columns) + list(target_columns) +
+                                         ([] if scaler is None else list(scaler.column_types))))
+            df = self.panel.to_frame(symbol, start, end, columns)
+            if scaler is not None:
+                self.scaler = scaler
+                df = self.scaler.transform(df, in_place=True)
+            else:
+                self.scaler = CustomScaler(scaler_config, df, grouped=True)
+                df = self.scaler.fit_transform(df, in_place=True)
+            assert not df.isnull().any().any(), f"scaled df has null after transform"
+            self.values = df.to_numpy()
+            self.rows = np.arange(len(df))
+            self.feature_index = np.array([columns.index(col) for col in feature_columns])
+            self.target_index = np.array([columns.index(col) for col in target_columns])
+
+        # contiguous rows (the usual case) can be sliced instead of gathered
+        self.contiguous = bool(len(self.rows) == 1 or (np.diff(self.rows) == 1).all())
+
+    def __len__(self):
+        return max(0, len(self.rows) - self.seq_length - self.change + 1)
+
+    def __getitem__(self, index):
+        if self.contiguous:
+            first = self.rows[0] + index
+            x = self.values[first:first + self.seq_length, self.feature_index]
+        else:
+            x = self.values[self.rows[index:index + self.seq_length]][:, self.feature_index]
+        y = self.values[self.rows[index + self.seq_length + self.change - 1], self.target_index]
+        return torch.tensor(x, dtype=torch.float32), torch.tensor(y, dtype=torch.float32)
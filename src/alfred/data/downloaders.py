@@ -1,51 +1,317 @@
 import os
+import io
+import numpy as np
 import pandas as pd
 import yfinance as yf
 import time
+import threading
 import requests
 import ssl
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from .http_cache import ResponseCache
 
 ssl.create_default_https_context = ssl._create_unverified_context
 
-def download_ticker_list(ticker_list, output_dir="./data/", interval="1d", tail=-1, head=-1):
+
+# how far behind the last cached bar an incremental fetch starts, the overlap is used to validate the cache
+INCREMENTAL_OVERLAP_DAYS = 7
+
+
+def yahoo_fetch(tickers, interval="1d", start=None):
+    # thin wrapper around yf.download so a local stand-in can be swapped in (see scripts/benchmarks)
+    # group_by ticker means every result, even a single symbol, comes back keyed by ticker
+    return yf.download(tickers=tickers, interval=interval, start=start, group_by="ticker", threads=False,
+                       progress=False)
+
+
+def frame_for_ticker(batch_df, ticker):
+    if batch_df is None or len(batch_df) == 0:
+        return pd.DataFrame()
+    df = pd.DataFrame(batch_df)
+    if isinstance(df.columns, pd.MultiIndex):
+        if ticker not in df.columns.get_level_values(0):
+            return pd.DataFrame()
+        df = df[ticker]
+    # batched requests align every symbol on one date index, drop the dates this ticker didn't trade
+    return df.dropna(how="all")
+
+
+def save_ticker_frame(ticker, df, output_dir, tail=-1, head=-1):
+    if tail != -1:
+        df = df.tail(tail)
+    if head != -1:
+        df = df.head(head)
+    if len(df) == 0:
+        return False
+    min_date = df.index.min()
+    max_date = df.index.max()
+    print(f"Min date for {ticker}: {min_date}")
+    print(f"Max date for {ticker}: {max_date}")
+    df.to_csv(os.path.join(output_dir, f"{ticker}.csv"))
+    return True
+
+
+def read_cached_tail(path, rows=10):
+    # reads the header plus the last few rows of a cached price file without parsing the whole history
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        header = f.readline().rstrip(b"\r\n")
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = min(size, 4096)
+        while True:
+            f.seek(size - block)
+            lines = f.read(block).splitlines()
+            if len(lines) > rows + 1 or block == size:
+                break
+            block = min(size, block * 2)
+    lines = [line for line in lines[-rows:] if line.strip() and line != header]
+    if len(lines) == 0:
+        return None
+    df = pd.read_csv(io.BytesIO(b"\n".join([header] + lines)), index_col=0)
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+def last_cached_date(output_dir, ticker):
+    tail = read_cached_tail(os.path.join(output_dir, f"{ticker}.csv"), rows=1)
+    return None if tail is None else tail.index.max()
+
+
+def append_ticker_frame(ticker, df, output_dir):
+    '''
+    Appends the bars in df newer than the cached file. The bars that overlap the cache are compared first,
+    if they don't match (a split or dividend re-adjusted history) we return "mismatch" and leave the file alone
+    so the caller can fall back to a full download.
+    '''
+    path = os.path.join(output_dir, f"{ticker}.csv")
+    cached = read_cached_tail(path)
+    if cached is None:
+        return "missing"
+    last_date = cached.index.max()
+    if len(df) == 0:
+        return "current"
+
+    columns = [col for col in cached.columns if col in df.columns]
+    if len(columns) != len(cached.columns):
+        return "mismatch"
+    overlap = cached.index.intersection(df.index)
+    if len(overlap) == 0:
+        return "mismatch"
+    # csv round trips floats, so compare with a tolerance rather than exactly
+    if not np.allclose(cached.loc[overlap, columns].to_numpy(dtype=float),
+                       df.loc[overlap, columns].to_numpy(dtype=float), rtol=1e-6, equal_nan=True):
+        return "mismatch"
+
+    new_bars = df.loc[df.index > last_date, columns]
+    if len(new_bars) == 0:
+        return "current"
+    new_bars.to_csv(path, mode="a", header=False)
+    print(f"Appended {len(new_bars)} bars to {ticker}, max date: {new_bars.index.max()}")
+    return "appended"
+
+
+def incremental_start(last_date):
+    return (last_date - pd.Timedelta(days=INCREMENTAL_OVERLAP_DAYS)).strftime("%Y-%m-%d")
+
+
+def refresh_ticker(ticker, fetch, interval, output_dir, tail=-1, head=-1, incremental=False):
+    if incremental:
+        last_date = last_cached_date(output_dir, ticker)
+        if last_date is not None:
+            df = frame_for_ticker(fetch([ticker], interval, start=incremental_start(last_date)), ticker)
+            status = append_ticker_frame(ticker, df, output_dir)
+            if status != "mismatch":
+                return True
+            print(f"Cached history for {ticker} no longer matches, re-downloading")
+    df = frame_for_ticker(fetch([ticker], interval), ticker)
+    return save_ticker_frame(ticker, df, output_dir, tail, head)
+
+
+def download_ticker_list(ticker_list, output_dir="./data/", interval="1d", tail=-1, head=-1, fetch=yahoo_fetch,
+                         incremental=False, manifest=None):
     bad_tickers = []
     for ticker in ticker_list:
         time.sleep(0.25)
         print("ticker: ", ticker)
+        error = None
         try:
-            ticker_obj = yf.download(tickers=ticker, interval=interval)
-            df = pd.DataFrame(ticker_obj)
-            if tail != -1:
-                df = df.tail(tail)
-            if head != -1:
-                df = df.head(head)
-            if len(df) == 0:
+            if not refresh_ticker(ticker, fetch, interval, output_dir, tail, head, incremental):
                 bad_tickers.append(ticker)
-            else:
-                min_date = df.index.min()
-                max_date = df.index.max()
-                print(f"Min date for {ticker}: {min_date}")
-                print(f"Max date for {ticker}: {max_date}")
-                df.to_csv(os.path.join(output_dir, f"{ticker}.csv"))
+                error = "no data"
         except (requests.exceptions.HTTPError, ValueError) as e:
             print(f"Failed to download {ticker} due to an HTTP or Value error: {e}")
             bad_tickers.append(ticker)
+            error = e
+        if manifest is not None:
+            manifest.record(ticker, "prices", error is None, error)
     return bad_tickers
 
 
+class TokenBucket:
+    '''
+    Thread safe token bucket. Requests can burst up to capacity, after that they are paced to rate per second.
+    '''
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_with_retry(fetch, tickers, interval, limiter, retries=3, backoff=1.0, start=None):
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            if start is None:
+                return fetch(tickers, interval)
+            return fetch(tickers, interval, start=start)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"Fetch of {tickers} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+def bulk_download_ticker_list(ticker_list, output_dir="./data/", interval="1d", tail=-1, head=-1, workers=4,
+                              batch_size=20, requests_per_second=2.0, retries=3, backoff=1.0, fetch=yahoo_fetch,
+                              incremental=False, manifest=None):
+    '''
+    Same contract as download_ticker_list (returns the bad tickers, writes {ticker}.csv per good symbol) but
+    tickers are requested batch_size at a time from a pool of workers sharing one token bucket.
+
+    With incremental, tickers that already have a cached file are batched separately and only fetch bars from
+    just before their last cached date. Those bars are appended in place.
+    '''
+    limiter = TokenBucket(requests_per_second)
+
+    last_dates = {}
+    if incremental:
+        for ticker in ticker_list:
+            last_date = last_cached_date(output_dir, ticker)
+            if last_date is not None:
+                last_dates[ticker] = last_date
+    # sort the cached tickers by staleness so each batch asks for a similar date range
+    cached = sorted(last_dates, key=last_dates.get)
+    fresh = [ticker for ticker in ticker_list if ticker not in last_dates]
+    batches = [(cached[i:i + batch_size], True) for i in range(0, len(cached), batch_size)]
+    batches += [(fresh[i:i + batch_size], False) for i in range(0, len(fresh), batch_size)]
+
+    def run_batch(batch, append):
+        # the bad tickers of the batch and why, so a failed fetch isn't mistaken for a ticker without data
+        bad = {}
+        start = incremental_start(min(last_dates[ticker] for ticker in batch)) if append else None
+        try:
+            batch_df = fetch_with_retry(fetch, batch, interval, limiter, retries, backoff, start=start)
+        except Exception as e:
+            print(f"Failed to download {batch} after {retries} retries: {e}")
+            return {ticker: e for ticker in batch}
+        for ticker in batch:
+            df = frame_for_ticker(batch_df, ticker)
+            if append:
+                if append_ticker_frame(ticker, df, output_dir) != "mismatch":
+                    continue
+                print(f"Cached history for {ticker} no longer matches, re-downloading")
+                try:
+                    df = frame_for_ticker(fetch_with_retry(fetch, [ticker], interval, limiter, retries, backoff),
+                                          ticker)
+                except Exception as e:
+                    print(f"Failed to download {ticker} after {retries} retries: {e}")
+                    bad[ticker] = e
+                    continue
+            if not save_ticker_frame(ticker, df, output_dir, tail, head):
+                bad[ticker] = "no data"
+        return bad
+
+    bad_tickers = []
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_batch, batch, append): batch for batch, append in batches}
+        for future in as_completed(futures):
+            bad = future.result()
+            bad_tickers.extend(bad)
+            if manifest is not None:
+                for ticker in futures[future]:
+                    manifest.record(ticker, "prices", ticker not in bad, bad.get(ticker))
+    elapsed = time.monotonic() - start
+    print(f"Downloaded {len(ticker_list)} tickers in {elapsed:.2f}s "
+          f"({len(ticker_list) / max(elapsed, 1e-9):.1f} tickers/s), {len(bad_tickers)} bad")
+
+    # keep the caller's ordering so the bad list is stable run to run
+    order = {ticker: i for i, ticker in enumerate(ticker_list)}
+    return sorted(bad_tickers, key=order.get)
+
+
+ALPHA_URL = 'https://www.alphavantage.co/query'
+
+
 class AlphaDownloader:
-    def __init__(self, key_file='./keys/alpha.txt'):
+    def __init__(self, key_file='./keys/alpha.txt', cache_dir='./data/alpha_cache', ttls=None, pool_size=10,
+                 base_url=ALPHA_URL):
         # Read the API key from the specified file
         with open(key_file, 'r') as file:
             self.api_key = file.readline().strip()
+        self.base_url = base_url
 
-    def earnings(self, symbol):
-        # Construct the URL for the API request
-        url = f'https://www.alphavantage.co/query?function=EARNINGS&symbol={symbol}&apikey={self.api_key}'
-        # Send the request and get the JSON response
-        response = requests.get(url, verify=False)
+        # one session for every call so connections (and their tls handshakes) get reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # cache_dir=None turns the response cache off
+        self.cache = ResponseCache(cache_dir, ttls) if cache_dir is not None else None
+
+    def query(self, function, cache_key, expected_key, verify=True, **params):
+        data = self.cached(function, cache_key)
+        if data is not None:
+            return data
+        return self.fetch(function, cache_key, expected_key, verify, **params)
+
+    def cached(self, function, cache_key):
+        if self.cache is None:
+            return None
+        return self.cache.get(function, cache_key)
+
+    def fetch(self, function, cache_key, expected_key, verify=True, **params):
+        # always goes to the network, the response is stored in the cache
+        response = self.session.get(self.base_url, params={'function': function, **params, 'apikey': self.api_key},
+                                    verify=verify)
+        response.raise_for_status()
         data = response.json()
 
+        # rate limit and bad symbol responses come back as a 200 with a Note/Information message, don't cache those
+        if expected_key not in data:
+            raise ValueError(f"Unexpected {function} response for {cache_key}: {data}")
+
+        if self.cache is not None:
+            self.cache.put(function, cache_key, data)
+        return data
+
+    def earnings(self, symbol):
+        return self.parse_earnings(self.query('EARNINGS', symbol, 'quarterlyEarnings', verify=False, symbol=symbol))
+
+    @staticmethod
+    def parse_earnings(data):
         # Convert the earnings data to a DataFrame
         annual_earnings = pd.DataFrame(data['annualEarnings'])
         quarterly_earnings = pd.DataFrame(data['quarterlyEarnings'])
@@ -69,11 +335,10 @@ class AlphaDownloader:
         quarterly_earnings.to_csv(quarterly_csv_file, index=False)
 
     def margins(self, symbol):
-        # Construct the URL for the API request
-        url = f'https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={symbol}&apikey={self.api_key}'
-        response = requests.get(url)
-        data = response.json()
+        return self.parse_margins(self.query('INCOME_STATEMENT', symbol, 'quarterlyReports', symbol=symbol))
 
+    @staticmethod
+    def parse_margins(data):
         # Extract relevant margin data
         quarterly_reports = data['quarterlyReports']
 
@@ -123,21 +388,27 @@ class AlphaDownloader:
         return df_margins
 
     def treasury_yields(self, maturities=['10year', '5year', '3year', '2year']):
-        # Initialize a DataFrame to hold all the yield data
-        yield_data = pd.DataFrame()
-
+        frames = []
         for maturity in maturities:
-            # Construct the URL for the Treasury Yield API request
-            url = f'https://www.alphavantage.co/query?function=TREASURY_YIELD&interval=monthly&maturity={maturity}&apikey={self.api_key}'
-            response = requests.get(url)
-            data = response.json()
+            data = self.query('TREASURY_YIELD', f'{maturity}_monthly', 'data', interval='monthly', maturity=maturity)
+            frames.append(self.parse_treasury(data, maturity))
+        return self.join_yields(frames)
 
-            # Extract the data and create a DataFrame
-            maturity_df = pd.DataFrame(data['data'])
-            maturity_df = maturity_df.rename(columns={'value': maturity})
-            maturity_df['date'] = pd.to_datetime(maturity_df['date'])
-            maturity_df.set_index('date', inplace=True)
+    @staticmethod
+    def parse_treasury(data, maturity):
+        # Extract the data and create a DataFrame
+        maturity_df = pd.DataFrame(data['data'])
+        maturity_df = maturity_df.rename(columns={'value': maturity})
+        maturity_df['date'] = pd.to_datetime(maturity_df['date'])
+        maturity_df.set_index('date', inplace=True)
+        return maturity_df
+
+    @staticmethod
+    def join_yields(frames):
+        # Initialize a DataFrame to hold all the yield data
+        yield_data = pd.DataFrame()
 
+        for maturity_df in frames:
             # Merge with the existing data
             if yield_data.empty:
                 yield_data = maturity_df
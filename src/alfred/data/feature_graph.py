@@ -0,0 +1,168 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .processors import rolling_means
+
+# registered features, in registration order. Each is (pattern regex, input templates, compute function)
+FEATURES = []
+
+
+def feature(pattern, *inputs):
+    '''
+    Registers a computed column. pattern is the column name with an optional {n} for an integer parameter (a window
+    or horizon) and inputs are the columns it is computed from, using the same {n}. The decorated function gets the
+    input columns as float64 arrays, the symbol start flags (see symbol_starts) and n, and returns the new column.
+
+        @feature("Close_MA_{n}", "Close")
+        def close_moving_average(inputs, starts, n): ...
+    '''
+    regex = re.compile("^" + re.escape(pattern).replace(r"\{n\}", r"(?P<n>\d+)") + "$")
+
+    def register(func):
+        FEATURES.append((regex, inputs, func))
+        return func
+
+    return register
+
+
+def batched(compute_all, kind):
+    '''
+    A feature function that is computed together with every other feature of the same compute_all and inputs in a
+    plan, in a single call: compute_all(inputs, starts, [(kind, params), ...]) returns their columns in that order.
+    For features that share most of their work, like labels for many horizons.
+    '''
+    def compute(inputs, starts, **params):
+        return compute_all(inputs, starts, [(kind, params)])[0]
+
+    compute.batch = compute_all
+    compute.kind = kind
+    return compute
+
+
+def resolve(name):
+    # (inputs, compute, params) for a registered column, None for a source column read from the data
+    for regex, inputs, func in FEATURES:
+        match = regex.match(name)
+        if match is not None:
+            params = {key: int(value) for key, value in match.groupdict().items()}
+            return [template.format(**params) for template in inputs], func, params
+    return None
+
+
+def symbol_starts(df, symbol_column=None):
+    # True on the first row of each symbol in a long format frame (rows grouped by symbol, dates ascending)
+    starts = np.zeros(len(df), dtype=bool)
+    if len(df) > 0:
+        starts[0] = True
+    if symbol_column is not None:
+        symbols = df[symbol_column].to_numpy()
+        starts[1:] = symbols[1:] != symbols[:-1]
+    return starts
+
+
+class FeaturePlan:
+    '''
+    The computation needed for a set of requested columns: the source columns to read and the computed columns in
+    dependency order. A computed column several requested columns depend on (a rolling mean for example) is one
+    step, computed once, and nothing that isn't needed is a step at all.
+    '''
+
+    def __init__(self, requested):
+        self.requested = list(requested)
+        self.sources = []
+        self.steps = []
+        visiting = set()
+        planned = set()
+
+        def visit(name):
+            if name in planned:
+                return
+            if name in visiting:
+                raise ValueError(f"Feature {name} depends on itself")
+            resolved = resolve(name)
+            if resolved is None:
+                self.sources.append(name)
+            else:
+                visiting.add(name)
+                inputs, func, params = resolved
+                for input_name in inputs:
+                    visit(input_name)
+                visiting.discard(name)
+                self.steps.append((name, inputs, func, params))
+            planned.add(name)
+
+        for name in self.requested:
+            visit(name)
+
+    @property
+    def computed(self):
+        # requested columns the plan computes, as opposed to reads
+        return [name for name in self.requested if name not in self.sources]
+
+    def compute(self, df, symbol_column=None):
+        '''
+        Returns df with the requested computed columns added (intermediates aren't kept), df itself isn't changed.
+        With symbol_column set, df is a long format panel and nothing is computed across a symbol boundary.
+        '''
+        # sources that are only passed through don't have to be in df
+        missing = [name for name in self.sources if name not in df.columns and
+                   any(name in inputs for _, inputs, _, _ in self.steps)]
+        if missing:
+            raise ValueError(f"Missing source columns: {missing}")
+        starts = symbol_starts(df, symbol_column)
+        values = {}
+
+        def column(name):
+            if name not in values:
+                values[name] = df[name].to_numpy(dtype=np.float64)
+            return values[name]
+
+        for name, inputs, func, params in self.steps:
+            if name in values:
+                continue
+            batch = getattr(func, "batch", None)
+            if batch is None:
+                values[name] = func([column(input_name) for input_name in inputs], starts, **params)
+                continue
+            # this and every later step of the same batch on the same inputs, their inputs are all ready now
+            group = [(step_name, step_func.kind, step_params) for step_name, step_inputs, step_func, step_params
+                     in self.steps if getattr(step_func, "batch", None) is batch and step_inputs == inputs
+                     and step_name not in values]
+            results = batch([column(input_name) for input_name in inputs], starts,
+                            [(kind, step_params) for _, kind, step_params in group])
+            for (step_name, _, _), result in zip(group, results):
+                values[step_name] = result
+        if not self.computed:
+            return df
+        # joined as one block, column by column inserts fragment the frame when there are hundreds of them
+        computed = pd.DataFrame({name: values[name] for name in self.computed}, index=df.index)
+        return pd.concat([df.drop(columns=[name for name in self.computed if name in df.columns]), computed], axis=1)
+
+    def __repr__(self):
+        steps = ", ".join(name for name, _, _, _ in self.steps)
+        return f"FeaturePlan(sources=[{', '.join(self.sources)}], steps=[{steps}])"
+
+
+def plan_features(requested):
+    return FeaturePlan(requested)
+
+
+def moving_averages(inputs, starts, requested):
+    # every requested window of a column in one rolling_means pass
+    means = rolling_means(inputs[0][:, None], starts, [params["n"] for _, params in requested])
+    return [mean[:, 0] for mean in means]
+
+
+def relative_difference(inputs, starts, n):
+    # (value - mean) / mean, same arithmetic as attach_moving_average_diffs
+    value, mean = inputs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (value - mean) / mean
+
+
+feature("Close_MA_{n}", "Close")(batched(moving_averages, "moving_average"))
+feature("Volume_MA_{n}", "Volume")(batched(moving_averages, "moving_average"))
+feature("Close_diff_MA_{n}", "Close", "Close_MA_{n}")(relative_difference)
+feature("Volume_diff_MA_{n}", "Volume", "Volume_MA_{n}")(relative_difference)
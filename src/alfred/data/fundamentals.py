@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+from .macro import asof_join
+from .readers import read_file, read_symbol_file, write_frame
+
+FUNDAMENTAL_COLUMNS = [
+    "reportedEPS",
+    "estimatedEPS",
+    "surprise",
+    "surprisePercentage",
+    'Margin_Gross',
+    'Margin_Operating',
+    'Margin_Net_Profit'
+]
+
+
+def events_file(symbol):
+    return f"{symbol}_events.csv"
+
+
+def build_event_table(quarterly_earnings, margins):
+    '''
+    One row per report date with every fundamental value known as of that date, the same values a daily forward
+    fill would carry, without the daily copies. quarterly_earnings and margins are the AlphaDownloader frames with
+    their dates in a "Date" column.
+    '''
+    frames = []
+    for frame in [quarterly_earnings, margins]:
+        frame = frame.set_index(pd.to_datetime(frame["Date"])).drop(columns=["Date"])
+        frames.append(frame.apply(pd.to_numeric, errors='coerce'))
+    events = frames[0].join(frames[1], how='outer').sort_index()
+    events = events[~events.index.duplicated(keep='last')]
+    events.index.name = "Date"
+    # forward fill - prevents lookahead, anything before the first report of a kind is 0
+    return events.ffill().fillna(0)
+
+
+def write_event_table(symbol, data_dir, events, storage="csv"):
+    return write_frame(events, os.path.join(data_dir, events_file(symbol)), storage)
+
+
+def read_event_table(data_path_, symbol, fail_on_missing=False):
+    return read_file(data_path_, events_file(symbol), fail_on_missing)
+
+
+def expand_events(df, events):
+    '''
+    Attaches the latest event row on or before each of df's dates, 0 before the first one, the same as the daily
+    forward filled table used to be. Vectorized with a searchsorted as-of lookup.
+    '''
+    return asof_join(df, events, dropna=False).fillna({col: 0 for col in events.columns})
+
+
+def read_fundamentals(data_path_, symbol, fail_on_missing=False, columns=None, start=None, end=None):
+    '''
+    Daily prices with the fundamentals expanded onto them at read time. columns/start/end only apply to the price
+    file, every event column is attached.
+    '''
+    prices = read_symbol_file(data_path_, symbol, fail_on_missing, columns=columns, start=start, end=end)
+    events = read_event_table(data_path_, symbol, fail_on_missing)
+    if prices is None or events is None:
+        return None
+    return expand_events(prices, events)
@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+# how long a cached alpha vantage response is trusted, keyed by the api function
+# quarterly reports rarely change so they can sit for a while, rates update daily
+DEFAULT_TTLS = {
+    "EARNINGS": 7 * DAY,
+    "INCOME_STATEMENT": 30 * DAY,
+    "TREASURY_YIELD": DAY,
+}
+
+
+class ResponseCache:
+    '''
+    Json api responses on disk at {cache_dir}/{endpoint}/{key}.json. An entry older than the endpoint's ttl
+    counts as a miss. Endpoints without a ttl are never cached.
+    '''
+
+    def __init__(self, cache_dir, ttls=None):
+        self.cache_dir = cache_dir
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, endpoint, key):
+        # symbols like ^VIX or BRK/B need to be safe file names
+        safe_key = re.sub(r'[^\w.^-]', '_', str(key))
+        return os.path.join(self.cache_dir, endpoint, f"{safe_key}.json")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, endpoint, key):
+        ttl = self.ttls.get(endpoint)
+        path = self._path(endpoint, key)
+        if ttl is None or not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl:
+            self._count(False)
+            return None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._count(False)
+            return None
+        self._count(True)
+        return data
+
+    def put(self, endpoint, key, data):
+        if self.ttls.get(endpoint) is None:
+            return
+        path = self._path(endpoint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a reader never sees half a file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"cache hits: {self.hits}, misses: {self.misses} ({rate:.1f}% hit rate)"
@@ -0,0 +1,153 @@
+import numpy as np
+
+from alfred.utils.moments import rolling_moments
+
+from .feature_graph import feature
+from .processors import rolling_means
+
+# trading days used to annualize volatility
+TRADING_DAYS = 252
+
+
+def to_block(values, starts):
+    '''
+    Lays a long format column (rows grouped by symbol, dates ascending, starts flagging each symbol's first row) out
+    as a [date, symbol] array with every symbol starting at row 0, NaN after a symbol's last row. Returns the array
+    and the (row, column) of each long row to gather the results back with.
+    '''
+    group_starts = np.flatnonzero(starts)
+    lengths = np.diff(np.append(group_starts, len(values)))
+    group = np.repeat(np.arange(len(group_starts)), lengths)
+    position = np.arange(len(values)) - group_starts[group]
+    block = np.full((lengths.max() if len(lengths) else 0, len(group_starts)), np.nan)
+    block[position, group] = values
+    return block, (position, group)
+
+
+def on_block(func):
+    # runs an indicator written for [date, symbol] arrays on long format feature inputs
+    def compute(inputs, starts, **params):
+        blocks = [to_block(values, starts) for values in inputs]
+        result = func(*[block for block, _ in blocks], **params)
+        position, group = blocks[0][1]
+        return result[position, group]
+
+    return compute
+
+
+def shift(x, periods=1):
+    # shift down along dates, NaN at the top like Series.shift
+    out = np.full(x.shape, np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def ema(x, alpha, min_periods=1):
+    '''
+    Exponential moving average of each column of a [date, symbol] array, y = alpha * x + (1 - alpha) * y_prev
+    starting from the first valid value (ewm(alpha=alpha, adjust=False)). A NaN input gives a NaN output and leaves
+    the average where it was. Rows before min_periods valid values are NaN.
+    '''
+    out = np.full(x.shape, np.nan)
+    state = np.full(x.shape[1:], np.nan)
+    count = np.zeros(x.shape[1:], dtype=np.int64)
+    for t in range(len(x)):
+        value = x[t]
+        valid = ~np.isnan(value)
+        state = np.where(valid, np.where(np.isnan(state), value, alpha * value + (1 - alpha) * state), state)
+        count += valid
+        out[t] = np.where(valid & (count >= min_periods), state, np.nan)
+    return out
+
+
+def wilder(x, n):
+    # Wilder's smoothing as used by RSI and ATR, an ema with alpha 1/n
+    return ema(x, 1.0 / n, min_periods=n)
+
+
+def rolling_std(x, n, ddof=1):
+    # rolling(n).std() of each column, NaN until a full window without NaNs. A variance rounded below 0 is 0
+    _, variance = rolling_moments(x, n, ddof)
+    return np.sqrt(np.where(variance < 0, 0.0, variance))
+
+
+def rolling_mean(x, n):
+    # rolling(n).mean() of each column, pandas' own running sum (see processors.rolling_means)
+    starts = np.zeros(len(x), dtype=bool)
+    starts[:1] = True
+    return rolling_means(x, starts, [n])[0]
+
+
+def rsi(close, n=14):
+    '''
+    Relative strength index of each column, 0 to 100, from Wilder smoothed gains and losses. 100 when there were
+    no losses over the smoothing period.
+    '''
+    delta = close - shift(close)
+    gain = wilder(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), n)
+    loss = wilder(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(loss == 0, np.where(np.isnan(gain), np.nan, 100.0), 100 - 100 / (1 + gain / loss))
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    # (macd line, signal line, histogram) of each column
+    line = close_ema(close, fast) - close_ema(close, slow)
+    signal_line = macd_signal(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def true_range(high, low, close):
+    # fmax ignores the missing previous close on a symbol's first bar, its range is just high - low
+    previous_close = shift(close)
+    return np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+
+def atr(high, low, close, n=14):
+    return wilder(true_range(high, low, close), n)
+
+
+def bollinger_width(close, n=20, k=2.0):
+    # (upper band - lower band) / middle band
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 2 * k * rolling_std(close, n) / rolling_mean(close, n)
+
+
+def log_returns(close):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(close / shift(close))
+
+
+def annualized_std(returns, n, periods_per_year=TRADING_DAYS):
+    return rolling_std(returns, n) * np.sqrt(periods_per_year)
+
+
+def realized_volatility(close, n=20, periods_per_year=TRADING_DAYS):
+    # annualized standard deviation of the last n log returns
+    return annualized_std(log_returns(close), n, periods_per_year)
+
+
+def close_ema(close, n):
+    # span n, like ewm(span=n)
+    return ema(close, 2 / (n + 1), n)
+
+
+def macd_signal(line, signal=9):
+    return ema(line, 2 / (signal + 1), signal)
+
+
+def difference(inputs, starts):
+    return inputs[0] - inputs[1]
+
+
+# MACD is spelled out as a chain of features so the emas are shared with anything else that asks for them
+feature("Close_EMA_{n}", "Close")(on_block(close_ema))
+feature("MACD", "Close_EMA_12", "Close_EMA_26")(difference)
+feature("MACD_signal", "MACD")(on_block(macd_signal))
+feature("MACD_hist", "MACD", "MACD_signal")(difference)
+feature("RSI_{n}", "Close")(on_block(rsi))
+feature("ATR_{n}", "High", "Low", "Close")(on_block(atr))
+feature("Bollinger_width_{n}", "Close")(on_block(bollinger_width))
+feature("Log_return", "Close")(on_block(log_returns))
+feature("Realized_vol_{n}", "Log_return")(on_block(annualized_std))
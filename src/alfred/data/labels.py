@@ -0,0 +1,101 @@
+import numpy as np
+
+from .feature_graph import batched, feature
+from .indicators import TRADING_DAYS, to_block
+
+# label columns for each kind, {n} is the horizon in bars
+LABEL_KINDS = {
+    "return": "price_change_term_{n}",
+    "direction": "price_direction_term_{n}",
+    "adverse_excursion": "max_adverse_excursion_term_{n}",
+    "volatility": "forward_volatility_term_{n}",
+    "drawdown": "max_drawdown_term_{n}",
+}
+
+# most values of the [date, symbol, horizon] window arrays worked on at once
+MAX_WINDOW_CELLS = 1 << 24
+
+
+def fill_forward_within(close, starts):
+    # forward fill within each symbol like pct_change pads, a symbol starting with NaNs keeps them
+    positions = np.arange(len(close))
+    return close[np.maximum.accumulate(np.where(~np.isnan(close) | starts, positions, 0))]
+
+
+def forward_labels(inputs, starts, requested, periods_per_year=TRADING_DAYS):
+    '''
+    Labels for every requested (kind, horizon) from one long format Close column (see feature_graph.symbol_starts),
+    looking n bars ahead within each symbol, NaN where a symbol has fewer than n bars left:
+
+        return               close n bars ahead / close - 1, exactly pct_change(n).shift(-n)
+        direction            1 if that return is positive, else 0
+        adverse_excursion    worst return from this close over the next n closes, never above 0
+        volatility           realized volatility, the annualized root mean square of the next n daily log returns
+        drawdown             largest fall from a running peak over this and the next n closes, never above 0
+
+    Closes are laid out as a [date, symbol] block padded with the longest horizon of NaNs. Returns read the block at
+    a shift, volatilities come from running sums and the path labels from running minima and maxima along sliding
+    windows of the block, so every horizon of a kind costs one pass over the data between them.
+    '''
+    filled = fill_forward_within(inputs[0], starts)
+    block, (position, group) = to_block(filled, starts)
+    dates, symbols = block.shape
+    horizons = [params["n"] for _, params in requested]
+    longest = max(horizons)
+    padded = np.full((dates + longest, symbols), np.nan)
+    padded[:dates] = block
+    results = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kinds = {kind for kind, _ in requested}
+        for kind, params in requested:
+            n = params["n"]
+            if kind in ("return", "direction"):
+                change = padded[n:n + dates] / block - 1
+                results[(kind, n)] = change if kind == "return" else \
+                    np.where(np.isnan(change), np.nan, (change > 0).astype(np.float64))
+
+        if "volatility" in kinds:
+            log_returns = np.log(padded[1:] / padded[:-1])
+            valid = ~np.isnan(log_returns)
+            log_returns[~valid] = 0.0
+            squares = np.zeros((len(padded), symbols))
+            counts = np.zeros((len(padded), symbols), dtype=np.int64)
+            np.cumsum(log_returns ** 2, axis=0, out=squares[1:])
+            np.cumsum(valid, axis=0, out=counts[1:])
+            for kind, params in requested:
+                n = params["n"]
+                if kind == "volatility":
+                    mean_square = (squares[n:n + dates] - squares[:dates]) / n
+                    complete = counts[n:n + dates] - counts[:dates] == n
+                    results[(kind, n)] = np.where(complete, np.sqrt(np.maximum(mean_square, 0.0) * periods_per_year),
+                                                  np.nan)
+
+        path_kinds = kinds & {"adverse_excursion", "drawdown"}
+        if path_kinds:
+            path_horizons = sorted({params["n"] for kind, params in requested if kind in path_kinds})
+            span = path_horizons[-1]
+            adverse = np.full((dates, symbols, len(path_horizons)), np.nan)
+            drawdown = np.full((dates, symbols, len(path_horizons)), np.nan)
+            take = np.array(path_horizons)
+            rows = max(1, MAX_WINDOW_CELLS // (symbols * (span + 1)))
+            for first in range(0, dates, rows):
+                last = min(first + rows, dates)
+                # [date, symbol, k] closes k = 0..span bars ahead
+                windows = np.lib.stride_tricks.sliding_window_view(padded[first:last + span], span + 1, axis=0)
+                if "adverse_excursion" in path_kinds:
+                    worst = np.minimum.accumulate(windows[..., 1:] / windows[..., :1] - 1, axis=-1)
+                    adverse[first:last] = np.minimum(worst[..., take - 1], 0.0)
+                if "drawdown" in path_kinds:
+                    falls = windows / np.maximum.accumulate(windows, axis=-1) - 1
+                    drawdown[first:last] = np.minimum.accumulate(falls, axis=-1)[..., take]
+            for kind, params in requested:
+                if kind in path_kinds:
+                    source = adverse if kind == "adverse_excursion" else drawdown
+                    results[(kind, params["n"])] = source[..., path_horizons.index(params["n"])]
+
+    return [results[(kind, params["n"])][position, group] for kind, params in requested]
+
+
+for label_kind, label_pattern in LABEL_KINDS.items():
+    feature(label_pattern, "Close")(batched(forward_labels, label_kind))
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from .readers import read_file
+
+
+def load_macro_series(data_path_):
+    '''
+    Reads ^VIX (Close as VIX) and the treasury yields once and puts them on one calendar, the union of their dates.
+    Each row only carries values known on or before its date: gaps are forward filled, rows before a series starts
+    stay NaN. The yields are monthly averages dated the first of their month, so each is re-dated to the first of the
+    following month, once the whole month it averages is known.
+    '''
+    vix = read_file(data_path_, "^VIX.csv", fail_on_missing=True, columns=["Close"])
+    vix = vix.rename(columns={'Close': 'VIX'})
+    treasuries = read_file(data_path_, "treasuries.csv", fail_on_missing=True, date_column="date")
+    # alpha vantage reports missing yields as "."
+    treasuries = treasuries.apply(pd.to_numeric, errors='coerce')
+    treasuries.index = treasuries.index + pd.offsets.MonthBegin(1)
+    macro = vix.join(treasuries, how='outer').sort_index()
+    macro = macro[~macro.index.duplicated(keep='last')]
+    return macro.ffill()
+
+
+def asof_join(df, macro, dropna=True):
+    '''
+    Attaches to every row of df the latest macro row dated on or before it (a backward as-of merge). df can be in any
+    order and have repeated dates, so one call covers a single symbol or a stacked multi symbol frame. Rows dated
+    before the macro data starts, or before one of its series starts, are dropped when dropna is set instead of
+    being filled from the future.
+    '''
+    macro_dates = macro.index.values.astype("datetime64[ns]")
+    positions = np.searchsorted(macro_dates, df.index.values.astype("datetime64[ns]"), side="right") - 1
+    values = macro.to_numpy(dtype=np.float64)[np.maximum(positions, 0)]
+    values[positions < 0] = np.nan
+
+    df = df.copy()
+    for i, col in enumerate(macro.columns):
+        df[col] = values[:, i]
+    if dropna:
+        df = df.dropna(subset=list(macro.columns))
+    return df
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+
+STAGES = ["prices", "fundamentals", "merged"]
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManifest:
+    '''
+    On disk record of which symbols finished each stage of a data refresh (prices, fundamentals, merged) so a rerun
+    after a crash or ctrl-c skips finished work and only retries failures.
+
+    The file is a json lines log, every status change appends one line and loading replays them. That keeps a
+    write per symbol cheap and a torn last line (killed mid write) only loses that one record.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.status = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = (entry["symbol"], entry["stage"])
+                self.status[key] = entry["status"]
+                if entry.get("error") is not None:
+                    self.errors[key] = entry["error"]
+                else:
+                    self.errors.pop(key, None)
+
+    def get(self, symbol, stage):
+        return self.status.get((symbol, stage))
+
+    def is_done(self, symbol, stage):
+        return self.get(symbol, stage) == DONE
+
+    def pending(self, symbols, stage, retry_failed=True):
+        # keeps the caller's order, failed symbols are only included when retrying them
+        return [symbol for symbol in symbols
+                if self.get(symbol, stage) is None or (retry_failed and self.get(symbol, stage) == FAILED)]
+
+    def record(self, symbol, stage, ok, error=None):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        status = DONE if ok else FAILED
+        entry = {"symbol": symbol, "stage": stage, "status": status}
+        if error is not None:
+            entry["error"] = str(error)
+        with self._lock:
+            self.status[(symbol, stage)] = status
+            if error is not None:
+                self.errors[(symbol, stage)] = str(error)
+            else:
+                self.errors.pop((symbol, stage), None)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+
+    def summary(self, stage, symbols=None):
+        if symbols is None:
+            symbols = sorted({symbol for symbol, entry_stage in self.status if entry_stage == stage})
+        counts = {DONE: 0, FAILED: 0, "pending": 0}
+        for symbol in symbols:
+            counts[self.get(symbol, stage) or "pending"] += 1
+        return counts
+
+    def failed(self, stage):
+        return [symbol for (symbol, entry_stage), status in self.status.items()
+                if entry_stage == stage and status == FAILED]
+
+    def has_failures(self):
+        # any symbol whose latest status in any stage is failed
+        return any(status == FAILED for status in self.status.values())
+
+    def print_summary(self, stage, symbols=None):
+        counts = self.summary(stage, symbols)
+        print(f"{stage}: {counts[DONE]} done, {counts[FAILED]} failed, {counts['pending']} pending")
+        for symbol in self.failed(stage):
+            if symbols is None or symbol in symbols:
+                print(f"  {symbol} failed: {self.errors.get((symbol, stage), 'unknown error')}")
+
+    def compact(self):
+        # rewrites the log with one line per symbol/stage
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for (symbol, stage), status in self.status.items():
+                    entry = {"symbol": symbol, "stage": stage, "status": status}
+                    if (symbol, stage) in self.errors:
+                        entry["error"] = self.errors[(symbol, stage)]
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+STATE_VERSION = 1
+
+
+class RollingMean:
+    '''
+    rolling(window).mean() one value at a time. It keeps the same Kahan compensated running sum, counters and
+    clamps as pandas' roll_mean so every mean is bit for bit the batch one, at O(1) per value.
+    '''
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+
+    def update(self, val):
+        if self.window == 1 or self.prev_value is None:
+            # pandas starts the running sum over whenever a window shares nothing with the previous one
+            self.sum_x = self.compensation_add = self.compensation_remove = 0.0
+            self.nobs = self.neg_ct = 0
+            self.num_consecutive_same_value = 0
+            self.prev_value = val
+        elif len(self.values) == self.window:
+            self._remove(self.values[0])
+        self.values.append(val)
+        self._add(val)
+        return self.mean()
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def mean(self):
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        if self.num_consecutive_same_value >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+    def to_dict(self):
+        return {"window": self.window, "values": list(self.values), "sum_x": self.sum_x,
+                "compensation_add": self.compensation_add, "compensation_remove": self.compensation_remove,
+                "nobs": self.nobs, "neg_ct": self.neg_ct,
+                "num_consecutive_same_value": self.num_consecutive_same_value, "prev_value": self.prev_value}
+
+    @classmethod
+    def from_dict(cls, state):
+        rolling = cls(state["window"])
+        rolling.values.extend(state["values"])
+        for key in ["sum_x", "compensation_add", "compensation_remove", "nobs", "neg_ct",
+                    "num_consecutive_same_value", "prev_value"]:
+            setattr(rolling, key, state[key])
+        return rolling
+
+
+def divide(numerator, denominator):
+    # numpy's division semantics, like the batch column arithmetic: dividing by zero gives inf or NaN, no exception
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(numerator) / np.float64(denominator))
+
+
+class OnlineFeatureState:
+    '''
+    Per symbol state for computing attach_moving_average_diffs features and the price_change_term labels
+    one daily bar at a time. update() is O(windows + horizons) and returns the new bar's features plus the labels of
+    earlier bars the new close resolved. The state serializes to json so a daily job can pick up where the last run
+    stopped instead of rebuilding the full history.
+    '''
+
+    def __init__(self, symbol, moving_averages_days=[7, 30, 90, 180], pred=[7, 30, 120, 240]):
+        self.symbol = symbol
+        self.moving_averages_days = list(moving_averages_days)
+        self.pred = list(pred)
+        self.close_means = [RollingMean(ma) for ma in self.moving_averages_days]
+        self.volume_means = [RollingMean(ma) for ma in self.moving_averages_days]
+        # (date, close) of the bars whose labels are still open, closes forward filled like pct_change does
+        self.recent_closes = deque(maxlen=max(self.pred) + 1 if self.pred else 1)
+        self.last_close = math.nan
+        self.last_date = None
+
+    def update(self, date, close, volume):
+        '''
+        Adds the next bar. Returns (features, labels): features maps each feature column to its value for this bar,
+        labels maps each label column to the (date, value) of the earlier bar it just became known for.
+        '''
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"{self.symbol}: bar for {date} is not after the last bar {self.last_date}")
+        close = float(close)
+        volume = float(volume)
+
+        features = {}
+        for ma, close_mean, volume_mean in zip(self.moving_averages_days, self.close_means, self.volume_means):
+            price_mean = close_mean.update(close)
+            mean_volume = volume_mean.update(volume)
+            features[f'Close_diff_MA_{ma}'] = divide(close - price_mean, price_mean)
+            features[f'Volume_diff_MA_{ma}'] = divide(volume - mean_volume, mean_volume)
+
+        if close == close:
+            self.last_close = close
+        self.recent_closes.append((date, self.last_close))
+        labels = {}
+        for pred in self.pred:
+            if len(self.recent_closes) > pred:
+                label_date, label_close = self.recent_closes[-1 - pred]
+                labels[f'price_change_term_{pred}'] = (label_date, divide(self.last_close, label_close) - 1)
+
+        self.last_date = date
+        return features, labels
+
+    def replay(self, df):
+        '''
+        Feeds every bar of a date indexed frame with Close and Volume through update(). Returns the features and
+        labels as a frame laid out like the batch functions produce, labels NaN where still unknown.
+        '''
+        rows = []
+        label_values = {}
+        for date, close, volume in zip(df.index, df['Close'].to_numpy(), df['Volume'].to_numpy()):
+            features, labels = self.update(date, close, volume)
+            rows.append(features)
+            for label, (label_date, value) in labels.items():
+                label_values[(label, label_date)] = value
+        out = pd.DataFrame(rows, index=df.index)
+        for pred in self.pred:
+            label = f'price_change_term_{pred}'
+            out[label] = [label_values.get((label, date), math.nan) for date in df.index]
+        return out
+
+    def to_dict(self):
+        return {"version": STATE_VERSION, "symbol": self.symbol,
+                "moving_averages_days": self.moving_averages_days, "pred": self.pred,
+                "close_means": [mean.to_dict() for mean in self.close_means],
+                "volume_means": [mean.to_dict() for mean in self.volume_means],
+                "recent_closes": [[date.isoformat(), close] for date, close in self.recent_closes],
+                "last_close": self.last_close,
+                "last_date": None if self.last_date is None else self.last_date.isoformat()}
+
+    @classmethod
+    def from_dict(cls, state):
+        if state["version"] != STATE_VERSION:
+            raise ValueError(f"Unsupported feature state version: {state['version']}")
+        online = cls(state["symbol"], state["moving_averages_days"], state["pred"])
+        online.close_means = [RollingMean.from_dict(mean) for mean in state["close_means"]]
+        online.volume_means = [RollingMean.from_dict(mean) for mean in state["volume_means"]]
+        online.recent_closes.extend((pd.Timestamp(date), close) for date, close in state["recent_closes"])
+        online.last_close = state["last_close"]
+        online.last_date = None if state["last_date"] is None else pd.Timestamp(state["last_date"])
+        return online
+
+    def save(self, path):
+        # write then rename so a crashed job never leaves half a state file behind
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
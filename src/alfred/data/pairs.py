@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .cross_section import forward_fill, load_close_matrix, trailing_mean
+
+
+def load_pairs(path):
+    # (main, inverse) symbol pairs from a Main,Inverse csv like lists/inverse_pairs.csv
+    pairs = pd.read_csv(path)
+    return list(zip(pairs["Main"].str.strip(), pairs["Inverse"].str.strip()))
+
+
+class PairFeatures:
+    '''
+    Rolling relationship of each symbol of a pair to the other leg, for every pair at once. Both legs of every pair
+    are laid out as columns of one [date, leg] array with the other leg's closes in the same column of a second
+    array, so each statistic is a handful of whole array operations however many pairs there are. For every window w:
+
+        Pair_ratio                close / other leg's close
+        Pair_spread_{w}           log ratio less its w bar mean
+        Pair_beta_{w}             beta of the daily log return on the other leg's
+        Pair_corr_{w}             correlation of the daily log returns
+
+    Everything only looks back and is NaN until w bars where both legs traded. A symbol listed in more than one pair
+    takes its features from the first.
+    '''
+
+    def __init__(self, dates, symbols, close, pairs, windows=[20, 60]):
+        self.dates = dates
+        column = {symbol: j for j, symbol in enumerate(symbols)}
+        pairs = [(main, inverse) for main, inverse in pairs if main in column and inverse in column]
+        legs = [main for main, _ in pairs] + [inverse for _, inverse in pairs]
+        others = [inverse for _, inverse in pairs] + [main for main, _ in pairs]
+
+        self.leg_index = {}
+        for j, symbol in enumerate(legs):
+            self.leg_index.setdefault(symbol, j)
+        self.pairs = pairs
+        self.features = {}
+
+        own = close[:, [column[symbol] for symbol in legs]]
+        other = close[:, [column[symbol] for symbol in others]]
+        # both legs on a date, prices carried forward over the days one didn't trade
+        both = ~np.isnan(own) & ~np.isnan(other)
+        own_filled = forward_fill(own)
+        other_filled = forward_fill(other)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(both, own_filled / other_filled, np.nan)
+            log_ratio = np.log(ratio)
+            own_return = np.full(own.shape, np.nan)
+            other_return = np.full(own.shape, np.nan)
+            own_return[1:] = np.log(own_filled[1:] / own_filled[:-1])
+            other_return[1:] = np.log(other_filled[1:] / other_filled[:-1])
+        own_return[~both] = np.nan
+        other_return[~both] = np.nan
+
+        self.features["Pair_ratio"] = ratio
+        for w in windows:
+            self.features[f"Pair_spread_{w}"] = log_ratio - trailing_mean(log_ratio, w)
+            mean_own = trailing_mean(own_return, w)
+            mean_other = trailing_mean(other_return, w)
+            covariance = trailing_mean(own_return * other_return, w) - mean_own * mean_other
+            # clamped, cancellation can leave a tiny negative variance on a flat window
+            variance_own = np.maximum(trailing_mean(own_return ** 2, w) - mean_own ** 2, 0.0)
+            variance_other = np.maximum(trailing_mean(other_return ** 2, w) - mean_other ** 2, 0.0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.features[f"Pair_beta_{w}"] = np.where(variance_other > 0, covariance / variance_other, np.nan)
+                self.features[f"Pair_corr_{w}"] = np.clip(
+                    np.where((variance_own > 0) & (variance_other > 0),
+                             covariance / np.sqrt(variance_own * variance_other), np.nan), -1.0, 1.0)
+
+    @property
+    def columns(self):
+        return list(self.features.keys())
+
+    @property
+    def symbols(self):
+        return list(self.leg_index.keys())
+
+    def partner(self, symbol):
+        j = self.leg_index[symbol]
+        main, inverse = self.pairs[j % len(self.pairs)]
+        return inverse if symbol == main else main
+
+    def attach(self, df, symbol):
+        # adds the symbol's pair columns to its date indexed frame, in place
+        j = self.leg_index[symbol]
+        index = df.index.values.astype("datetime64[ns]")
+        rows = np.minimum(np.searchsorted(self.dates, index), len(self.dates) - 1)
+        matched = self.dates[rows] == index
+        for name, values in self.features.items():
+            df[name] = np.where(matched, values[rows, j], np.nan)
+        return df
+
+
+def build_pair_features(data_path_, pairs, windows=[20, 60]):
+    symbols = list(dict.fromkeys(symbol for pair in pairs for symbol in pair))
+    dates, present, close = load_close_matrix(data_path_, symbols)
+    return PairFeatures(dates, present, close, pairs, windows)
@@ -0,0 +1,109 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .readers import read_file
+
+PANEL_VERSION = 1
+VALUES_FILE = "values.npy"
+DATES_FILE = "dates.npy"
+INDEX_FILE = "index.json"
+
+
+def build_panel(symbols, data_path, out_dir, feature_columns, file_suffix="_unscaled", dtype=np.float32,
+                date_column="Unnamed: 0"):
+    '''
+    Packs a list of symbol files into one [symbol, date, feature] array on disk, plus the date, symbol and feature
+    indexes needed to find things in it. Dates are the union of every symbol's dates, a symbol that didn't trade on a
+    date is NaN there. Files are read twice (dates, then values) so only one symbol's frame is in memory at a time.
+
+    date_column defaults to how the _unscaled csv files name their (unnamed) index, same as CachedStockDataSet.
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    feature_columns = list(feature_columns)
+
+    symbol_dates = {}
+    for symbol in symbols:
+        df = read_file(data_path, f"{symbol}{file_suffix}.csv", columns=feature_columns[:1], date_column=date_column)
+        if df is None:
+            print(f"Skipping {symbol}, no data file")
+            continue
+        symbol_dates[symbol] = df.index.values.astype("datetime64[D]")
+    symbols = list(symbol_dates.keys())
+    if len(symbols) == 0:
+        raise ValueError("No symbol files found to build a panel from")
+    dates = np.unique(np.concatenate(list(symbol_dates.values())))
+
+    values = np.lib.format.open_memmap(os.path.join(out_dir, VALUES_FILE), mode="w+", dtype=dtype,
+                                       shape=(len(symbols), len(dates), len(feature_columns)))
+    values[:] = np.nan
+    for i, symbol in enumerate(symbols):
+        df = read_file(data_path, f"{symbol}{file_suffix}.csv", columns=feature_columns, date_column=date_column)
+        missing = [col for col in feature_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"{symbol} is missing columns: {missing}")
+        positions = np.searchsorted(dates, df.index.values.astype("datetime64[D]"))
+        values[i, positions, :] = df[feature_columns].to_numpy(dtype=dtype)
+        print(f"packed {symbol} ({i + 1}/{len(symbols)})")
+    values.flush()
+    del values
+
+    np.save(os.path.join(out_dir, DATES_FILE), dates)
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as f:
+        json.dump({"version": PANEL_VERSION, "symbols": symbols, "features": feature_columns,
+                   "dtype": np.dtype(dtype).name, "file_suffix": file_suffix}, f)
+    return Panel(out_dir)
+
+
+class Panel:
+    '''
+    Read only view of a panel built by build_panel. The values are memory mapped, so opening one is just reading
+    the indexes and every process using the same panel shares the os page cache copy of it.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            index = json.load(f)
+        if index["version"] != PANEL_VERSION:
+            raise ValueError(f"Unsupported panel version: {index['version']}")
+        self.symbols = index["symbols"]
+        self.features = index["features"]
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.feature_index = {feature: i for i, feature in enumerate(self.features)}
+        self.dates = np.load(os.path.join(path, DATES_FILE))
+        self.values = np.load(os.path.join(path, VALUES_FILE), mmap_mode="r")
+
+    def get_symbol(self, symbol):
+        if symbol not in self.symbol_index:
+            raise ValueError(f"{symbol} is not in the panel at {self.path}")
+        return self.symbol_index[symbol]
+
+    def get_features(self, columns):
+        missing = [col for col in columns if col not in self.feature_index]
+        if missing:
+            raise ValueError(f"Columns not in the panel: {missing}")
+        return np.array([self.feature_index[col] for col in columns])
+
+    def date_range(self, start=None, end=None):
+        # [first, last) positions of the dates between start and end inclusive
+        first = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), "D"), "left")
+        last = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), "D"),
+                                                                   "right")
+        return int(first), int(last)
+
+    def symbol_rows(self, symbol, start=None, end=None):
+        # positions of the dates the symbol actually has data for, NaN rows are dates it didn't trade
+        i = self.get_symbol(symbol)
+        first, last = self.date_range(start, end)
+        present = ~np.isnan(self.values[i, first:last, :]).all(axis=1)
+        return first + np.flatnonzero(present)
+
+    def to_frame(self, symbol, start=None, end=None, columns=None):
+        # materializes one symbol as a DataFrame (a copy), mostly for inspection and scaling
+        columns = self.features if columns is None else list(columns)
+        rows = self.symbol_rows(symbol, start, end)
+        values = self.values[self.get_symbol(symbol)][rows][:, self.get_features(columns)]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.dates[rows], name="Date"), columns=columns)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import torch
 from sklearn.preprocessing import StandardScaler
@@ -20,6 +21,137 @@ def attach_moving_average_diffs(data: pd.DataFrame, moving_averages_days=[7, 30,
     return data, new_columns
 
 
+def attach_panel_moving_average_diffs(data: pd.DataFrame, moving_averages_days=[7, 30, 90, 180],
+                                      symbol_column=None, max_rows_per_chunk=2_000_000) -> pd.DataFrame:
+    '''
+    Same columns as attach_moving_average_diffs, computed for every window, Close and Volume at once over numpy
+    arrays. With symbol_column set, data is a long format panel: rows grouped by symbol, dates ascending within each
+    symbol, and windows never cross from one symbol into the next. Symbols are processed in chunks of at most
+    max_rows_per_chunk rows, each symbol counted as long as the longest in its chunk, to bound memory.
+    '''
+    values = data[['Close', 'Volume']].to_numpy(dtype=np.float64)
+    starts = np.zeros(len(data), dtype=bool)
+    if len(data) > 0:
+        starts[0] = True
+    if symbol_column is not None:
+        symbols = data[symbol_column].to_numpy()
+        starts[1:] = symbols[1:] != symbols[:-1]
+    means = rolling_means(values, starts, moving_averages_days, max_rows_per_chunk)
+
+    new_columns = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for ma, mean in zip(moving_averages_days, means):
+            close_col_name = f'Close_diff_MA_{ma}'
+            volume_col_name = f'Volume_diff_MA_{ma}'
+            data[close_col_name] = (values[:, 0] - mean[:, 0]) / mean[:, 0]
+            data[volume_col_name] = (values[:, 1] - mean[:, 1]) / mean[:, 1]
+            new_columns.extend([close_col_name, volume_col_name])
+
+    return data, new_columns
+
+
+def rolling_means(values, starts, windows, max_rows_per_chunk=2_000_000):
+    '''
+    Trailing means of a [rows, columns] array for each window, restarting wherever starts is True. Returns one
+    [rows, columns] array per window, NaN until a full window without NaNs is available like rolling(window).mean().
+    '''
+    group_starts = np.flatnonzero(starts)
+    group_ends = np.append(group_starts[1:], len(values))
+    means = [np.full(values.shape, np.nan) for _ in windows]
+
+    # each chunk is walked as a [symbol, longest symbol, column] block, so it is the padded block that's capped
+    padded = group_ends - group_starts
+    first = 0
+    while first < len(group_starts):
+        # take whole symbols until the chunk is full (always at least one)
+        last = first + 1
+        longest = padded[first]
+        while last < len(group_starts) and \
+                (last - first + 1) * max(longest, padded[last]) <= max_rows_per_chunk:
+            longest = max(longest, padded[last])
+            last += 1
+        chunk_means = _grouped_rolling_means(values, group_starts[first:last], group_ends[first:last], windows)
+        rows = slice(group_starts[first], group_ends[last - 1])
+        for mean, chunk_mean in zip(means, chunk_means):
+            mean[rows] = chunk_mean
+        first = last
+    return means
+
+
+def _grouped_rolling_means(values, group_starts, group_ends, windows):
+    '''
+    rolling(window).mean() of each group, the same Kahan compensated running sum, counters and clamps as pandas'
+    roll_mean (and online_features.RollingMean) applied in the same order, so every mean is bit for bit pandas'.
+    The values are walked one date at a time, each step vectorized over symbols, columns and windows.
+    '''
+    lengths = group_ends - group_starts
+    offset = group_starts[0]
+    values = values[offset:group_ends[-1]]
+    group = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(values)) - (group_starts - offset)[group]
+
+    # [symbol, date, column] block, NaN padded past each symbol's end since adding or removing a NaN is a no-op
+    block = np.full((len(lengths), lengths.max(), values.shape[1]), np.nan)
+    block[group, position] = values
+
+    windows = np.asarray(windows)
+    minimum = windows[:, None, None]
+    shape = (len(windows), len(lengths), values.shape[1])
+    sum_x = np.zeros(shape)
+    compensation_add = np.zeros(shape)
+    compensation_remove = np.zeros(shape)
+    nobs = np.zeros(shape, dtype=np.int64)
+    neg_ct = np.zeros(shape, dtype=np.int64)
+    num_consecutive_same_value = np.zeros(shape, dtype=np.int64)
+    prev_value = np.full(shape, np.nan)
+    # pandas starts the running sum over whenever a window shares nothing with the previous one
+    restart = windows == 1
+
+    means = [np.full(values.shape, np.nan) for _ in windows]
+    first_rows = group_starts - offset
+    for date in range(block.shape[1]):
+        incoming = np.broadcast_to(block[:, date], shape)
+        if date > 0 and restart.any():
+            for state in [sum_x, compensation_add, compensation_remove, nobs, neg_ct, num_consecutive_same_value]:
+                state[restart] = 0
+            prev_value[restart] = incoming[restart]
+
+        # remove the values leaving each window, NaN where nothing leaves yet
+        leaving = block[:, np.maximum(date - windows, 0)].transpose(1, 0, 2).copy()
+        leaving[(date < windows) | restart] = np.nan
+        valid = ~np.isnan(leaving)
+        nobs -= valid
+        y = -leaving - compensation_remove
+        t = sum_x + y
+        np.copyto(compensation_remove, t - sum_x - y, where=valid)
+        np.copyto(sum_x, t, where=valid)
+        neg_ct -= valid & np.signbit(leaving)
+
+        # then add the incoming value
+        valid = ~np.isnan(incoming)
+        nobs += valid
+        y = incoming - compensation_add
+        t = sum_x + y
+        np.copyto(compensation_add, t - sum_x - y, where=valid)
+        np.copyto(sum_x, t, where=valid)
+        neg_ct += valid & np.signbit(incoming)
+        same = incoming == prev_value
+        np.copyto(num_consecutive_same_value, np.where(same, num_consecutive_same_value + 1, 1), where=valid)
+        np.copyto(prev_value, incoming, where=valid)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = sum_x / nobs
+        mean = np.where(num_consecutive_same_value >= nobs, prev_value,
+                        np.where(((neg_ct == 0) & (mean < 0)) | ((neg_ct == nobs) & (mean > 0)), 0.0, mean))
+        mean[(nobs < minimum) | (nobs == 0)] = np.nan
+
+        alive = lengths > date
+        rows = first_rows[alive] + date
+        for out, window_mean in zip(means, mean):
+            out[rows] = window_mean[alive]
+    return means
+
+
 def scale_relevant_training_columns(data: pd.DataFrame, columns_to_scale: list) -> pd.DataFrame:
     scaled_df = data.copy()
 
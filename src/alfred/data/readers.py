@@ -1,29 +1,153 @@
+import json
+
+import numpy as np
 import pandas as pd
 import os
 
+# columnar files live next to their csv with this extension, the date index is always stored as "Date"
+COLUMNAR_EXTENSION = ".parquet"
+COLUMNAR_DATE_COLUMN = "Date"
+
+# a partitioned output is a directory of part files plus an index listing them in order
+PARTITION_INDEX = "index.json"
+PARTITION_VERSION = 1
+
+
+def read_processed_file(data_path_, symbol, fail_on_missing=False, columns=None, start=None, end=None):
+    return read_file(data_path_, f"{symbol}_processed.csv", fail_on_missing, columns=columns, start=start, end=end)
+
+
+def read_symbol_file(data_path_, symbol, fail_on_missing=False, date_index=True, columns=None, start=None, end=None):
+    return read_file(data_path_, f"{symbol}.csv", fail_on_missing, date_index, columns, start, end)
+
 
-def read_processed_file(data_path_, symbol, fail_on_missing=False):
-    return read_file(data_path_, f"{symbol}_processed.csv", fail_on_missing)
+def read_file(data_path_, file, fail_on_missing=False, date_index=True, columns=None, start=None, end=None,
+              date_column="Date"):
+    return read_path(os.path.join(data_path_, file), fail_on_missing, date_index, columns, start, end, date_column)
 
 
-def read_symbol_file(data_path_, symbol, fail_on_missing=False, date_index=True):
-    return read_file(data_path_, f"{symbol}.csv", fail_on_missing, date_index)
+def columnar_path(path):
+    return f"{os.path.splitext(path)[0]}{COLUMNAR_EXTENSION}"
 
 
-def read_file(data_path_, file, fail_on_missing=False, date_index=True):
-    symbol_file = os.path.join(data_path_, file)
+def has_current_columnar(path):
+    # a columnar copy is only used when it is at least as new as the csv, so a csv refreshed after migration
+    # (an incremental price append for example) is never shadowed by stale columnar data
+    columnar = columnar_path(path)
+    if columnar == path:
+        return os.path.exists(path)
+    if not os.path.exists(columnar):
+        return False
+    return not os.path.exists(path) or os.path.getmtime(columnar) >= os.path.getmtime(path)
+
+
+def data_file_exists(path):
+    return os.path.exists(path) or os.path.exists(columnar_path(path))
+
+
+def read_path(path, fail_on_missing=False, date_index=True, columns=None, start=None, end=None, date_column="Date"):
+    '''
+    Reads a data file, preferring its columnar copy when there is one. columns limits the columns read and
+    start/end (inclusive) limit the rows, for columnar files both are pushed down into the reader so skipped
+    columns and dates are never parsed.
+    '''
     data_df = None
     try:
-        data_df = pd.read_csv(symbol_file)
-        if date_index:
-            data_df['Date'] = pd.to_datetime(data_df['Date'])
-            data_df.set_index('Date', inplace=True)
+        if has_current_columnar(path):
+            data_df = _read_columnar(columnar_path(path), date_index, columns, start, end)
+        else:
+            data_df = _read_csv(path, date_index, columns, start, end, date_column)
     except FileNotFoundError as fnfe:
-        print(f"The file {symbol_file} was not found.")
+        print(f"The file {path} was not found.")
         if fail_on_missing:
             raise fnfe
     except pd.errors.ParserError as pe:
-        print(f"The file {symbol_file} could not be parsed as a CSV. Continuing")
+        print(f"The file {path} could not be parsed as a CSV. Continuing")
         if fail_on_missing:
             raise pe
     return data_df
+
+
+def _read_csv(path, date_index, columns, start, end, date_column):
+    usecols = None
+    if columns is not None:
+        usecols = [date_column] + [col for col in columns if col != date_column] if date_index else list(columns)
+    data_df = pd.read_csv(path, usecols=usecols)
+    if date_index:
+        data_df[date_column] = pd.to_datetime(data_df[date_column])
+        data_df.set_index(date_column, inplace=True)
+        if start is not None or end is not None:
+            data_df = data_df.loc[_date_mask(data_df.index, start, end)]
+    if columns is not None:
+        data_df = data_df[[col for col in columns if col in data_df.columns]]
+    return data_df
+
+
+def _read_columnar(path, date_index, columns, start, end):
+    filters = []
+    if start is not None:
+        filters.append((COLUMNAR_DATE_COLUMN, ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append((COLUMNAR_DATE_COLUMN, "<=", pd.Timestamp(end)))
+    data_df = pd.read_parquet(path, columns=None if columns is None else list(columns),
+                              filters=filters if filters else None)
+    if not date_index:
+        data_df = data_df.reset_index()
+    return data_df
+
+
+def _date_mask(index, start, end):
+    mask = np.ones(len(index), dtype=bool)
+    if start is not None:
+        mask &= index >= pd.Timestamp(start)
+    if end is not None:
+        mask &= index <= pd.Timestamp(end)
+    return mask
+
+
+def date_bounds(path, date_column="Date"):
+    # first and last date in a file. For columnar files this comes from the footer statistics, nothing is scanned
+    if has_current_columnar(path):
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(columnar_path(path)).metadata
+        index = metadata.schema.names.index(COLUMNAR_DATE_COLUMN)
+        mins, maxes = [], []
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(index).statistics
+            if stats is None or not stats.has_min_max:
+                dates = pd.read_parquet(columnar_path(path), columns=[]).index
+                return dates.min(), dates.max()
+            mins.append(pd.Timestamp(stats.min))
+            maxes.append(pd.Timestamp(stats.max))
+        return min(mins), max(maxes)
+    dates = pd.to_datetime(pd.read_csv(path, usecols=[date_column])[date_column])
+    return dates.min(), dates.max()
+
+
+def write_frame(df, path, storage="csv"):
+    '''
+    Writes a date indexed frame as csv (path as given) or columnar (path with the columnar extension).
+    '''
+    if storage == "csv":
+        df.to_csv(path)
+        return path
+    if storage != "parquet":
+        raise ValueError(f"Unsupported storage: {storage}")
+    out_path = columnar_path(path)
+    df = df.copy(deep=False)
+    df.index = pd.DatetimeIndex(df.index, name=COLUMNAR_DATE_COLUMN)
+    df.to_parquet(out_path)
+    return out_path
+
+
+def read_partitioned(path, columns=None, start=None, end=None):
+    '''
+    Reads every part of a partitioned output (see create-final-data-set --stream) back into one frame, columns and
+    start/end are applied to each part as it is read.
+    '''
+    with open(os.path.join(path, PARTITION_INDEX), "r") as f:
+        index = json.load(f)
+    if index["version"] != PARTITION_VERSION:
+        raise ValueError(f"Unsupported partition version: {index['version']}")
+    return pd.concat([read_path(os.path.join(path, part), fail_on_missing=True, columns=columns, start=start, end=end)
+                      for part in index["parts"]])
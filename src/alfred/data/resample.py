@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from .readers import read_symbol_file
+
+# Yahoo interval names we can derive from daily bars
+INTERVALS = ["1wk", "1mo"]
+
+
+def period_starts(dates, interval):
+    '''
+    The date each daily bar's period is labelled with, the way Yahoo labels its bars: the Monday of the week for
+    1wk, the first of the month for 1mo.
+    '''
+    days = dates.astype("datetime64[D]")
+    if interval == "1wk":
+        # 1970-01-01 was a Thursday, shift so weeks start on Monday
+        return days - (days.astype(np.int64) + 3) % 7
+    if interval == "1mo":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unsupported interval: {interval}, expected one of {INTERVALS}")
+
+
+def first_valid(values, starts, ends):
+    # first non-NaN value in each [start, end) group, NaN for an all NaN group
+    positions = np.where(~np.isnan(values), np.arange(len(values)), len(values))
+    first = np.minimum.reduceat(positions, starts)
+    return np.where(first < ends, values[np.minimum(first, len(values) - 1)], np.nan)
+
+
+def last_valid(values, starts, ends):
+    positions = np.where(~np.isnan(values), np.arange(len(values)), -1)
+    last = np.maximum.reduceat(positions, starts)
+    return np.where(last >= starts, values[np.maximum(last, 0)], np.nan)
+
+
+def resample_bars(frames, interval):
+    '''
+    Weekly or monthly OHLCV bars from daily ones, for many symbols at once. frames maps symbol to its date indexed
+    daily frame. Every symbol's rows are stacked into one set of arrays and each (symbol, period) group is reduced
+    with reduceat: Open is the first bar's, High the highest, Low the lowest, Close (and Adj Close) the last and
+    Volume the total, NaNs skipped. Other columns take the last value. Returns symbol to resampled frame, each with
+    the columns of its own daily frame.
+    '''
+    symbols = [symbol for symbol, df in frames.items() if len(df) > 0]
+    if not symbols:
+        return {}
+    frames = {symbol: frames[symbol].sort_index() for symbol in symbols}
+    # the union of every symbol's columns, in the order they are first seen
+    columns = list(dict.fromkeys(column for symbol in symbols for column in frames[symbol].columns))
+    lengths = np.array([len(frames[symbol]) for symbol in symbols])
+    owner = np.repeat(np.arange(len(symbols)), lengths)
+    dates = np.concatenate([frames[symbol].index.values.astype("datetime64[ns]") for symbol in symbols])
+    periods = period_starts(dates, interval)
+
+    # rows are grouped by symbol with dates ascending, so a group starts wherever the symbol or period changes
+    new_group = np.ones(len(dates), dtype=bool)
+    new_group[1:] = (owner[1:] != owner[:-1]) | (periods[1:] != periods[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(dates))
+
+    resampled = {}
+    for column in columns:
+        values = np.concatenate([frames[symbol][column].to_numpy(dtype=np.float64) if column in frames[symbol]
+                                 else np.full(len(frames[symbol]), np.nan) for symbol in symbols])
+        if column == "Open":
+            resampled[column] = first_valid(values, starts, ends)
+        elif column == "High":
+            resampled[column] = np.fmax.reduceat(values, starts)
+        elif column == "Low":
+            resampled[column] = np.fmin.reduceat(values, starts)
+        elif column == "Volume":
+            resampled[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            resampled[column] = last_valid(values, starts, ends)
+
+    group_owner = owner[starts]
+    bounds = np.searchsorted(group_owner, np.arange(len(symbols) + 1))
+    out = {}
+    for i, symbol in enumerate(symbols):
+        daily = frames[symbol]
+        rows = slice(bounds[i], bounds[i + 1])
+        index = pd.DatetimeIndex(periods[starts[rows]].astype("datetime64[ns]"), name=daily.index.name or "Date")
+        df = pd.DataFrame({column: resampled[column][rows] for column in daily.columns}, index=index)
+        # integer columns (Volume) go back to integers so the files look like the downloaded ones
+        integers = [column for column in daily.columns if daily[column].dtype.kind in "iu"]
+        out[symbol] = df.astype({column: np.int64 for column in integers if not df[column].isna().any()})
+    return out
+
+
+def resample_symbols(data_path_, symbols, interval, max_rows_per_chunk=2_000_000):
+    '''
+    Yields (symbol, resampled frame) for every symbol with a cached daily file, symbols without one are left out.
+    The daily files are read and resampled in chunks of whole symbols of at most max_rows_per_chunk rows (always at
+    least one symbol), so memory is bounded by the chunk rather than the symbol list.
+    '''
+    frames = {}
+    rows = 0
+    for symbol in symbols:
+        df = read_symbol_file(data_path_, symbol)
+        if df is None:
+            continue
+        df = df.dropna(how="all")
+        if frames and rows + len(df) > max_rows_per_chunk:
+            yield from resample_bars(frames, interval).items()
+            frames = {}
+            rows = 0
+        frames[symbol] = df
+        rows += len(df)
+    if frames:
+        yield from resample_bars(frames, interval).items()
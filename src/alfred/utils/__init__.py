@@ -1,3 +1,4 @@
 from .custom_scaler import *
+from .quantile_sketch import *
 from .masking import *
 from .analysis_utils import *
\ No newline at end of file
@@ -3,10 +3,17 @@ from sklearn.preprocessing import StandardScaler, MinMaxScaler, RobustScaler
 import numpy as np
 import joblib
 import re
+from abc import ABCMeta, abstractmethod
 
+from .moments import rolling_moments
+from .quantile_sketch import QuantileSketch
+from .scaler_artifact import check_block, forward_fill, log_return_transform, save_artifact, signed_log1p
 
-def signed_log1p(x):
-    return np.sign(x) * np.log1p(np.abs(x))
+
+def nonzero_scale(scale):
+    # like sklearn, a feature with (next to) no spread is left unscaled rather than divided by zero
+    scale = np.asarray(scale, dtype=np.float64)
+    return np.where(scale < 10 * np.finfo(np.float64).eps, 1.0, scale)
 
 
 from sklearn.base import BaseEstimator, TransformerMixin
@@ -29,10 +36,12 @@ class LogReturnScaler(BaseEstimator, TransformerMixin):
 
     '''
 
-    def __init__(self, cumsum: bool = True, amplifier: int = 2):
+    def __init__(self, cumsum: bool = True, amplifier: int = 2, keep_intermediates: bool = True):
         self.do_cumsum = cumsum
         self.amplifier = amplifier
-        # used to capture interim steps so they can be graphed
+        # used to capture interim steps so they can be graphed, without keep_intermediates transform skips them and
+        # works in one output array
+        self.keep_intermediates = keep_intermediates
         self.cumsum = None
         self.log_returns = None
         self.amplified = None
@@ -41,25 +50,26 @@ class LogReturnScaler(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self  # This scaler doesn't require fitting
 
+    def partial_fit(self, X, y=None):
+        return self
+
     def transform(self, input_data, y=None):
-        if isinstance(input_data, np.ndarray):
-            input = pd.Series(input_data)
-        else:
-            input = input_data
-        # zeros negative values and nulls will break this
-        assert(input.where((input<0)), "this transform only support data that is >=0 no negative numbers")
-        scrub_condition = (input == 0) | (input.isnull())
-        cleaned = input.where(~scrub_condition).ffill()
-        X = np.asarray(cleaned)
+        # a column or a 2-D block of columns, each column is transformed on its own
+        X = np.asarray(input_data)
+        if X.ndim == 1:
+            X = X[:, None]
+        if not self.keep_intermediates:
+            return log_return_transform(X, self.do_cumsum, self.amplifier)
+        # zeros negative values and nulls will break this, zeros and nulls are replaced by the last good value
+        X = forward_fill(np.where(X == 0, np.nan, X))
         self.original = X
         # todo you still have the off by 1 issue here, append the last value to the end
         X = self.log_returns = np.diff(np.log(X), axis=0)  # Log returns
         if self.do_cumsum:
-            X = self.cumsum = X.cumsum()
+            X = self.cumsum = X.cumsum(axis=0)
         if self.amplifier != 0:
             X = self.amplified = self.amplifier * X
-        X = np.append(X, X[-1])
-        return np.expand_dims(X, axis=1)  # to match what minmax scaler produces
+        return np.concatenate([X, X[-1:]], axis=0)  # (rows, columns) to match what minmax scaler produces
 
     def inverse_transform(self, X, initial_price=None):
         if initial_price is None:
@@ -68,6 +78,25 @@ class LogReturnScaler(BaseEstimator, TransformerMixin):
         prices = np.exp(np.cumsum(X, axis=0))  # Reverse log returns by cumulative sum
         return np.vstack([initial_price, initial_price * prices])  # Recover prices by starting with the initial price
 
+    def inverse_transform_windows(self, X, initial_prices, include_initial=False):
+        '''
+        inverse_transform for a whole [windows x horizon] matrix at once, each row the log returns of one window
+        (predictions for example) anchored on its own price in initial_prices. Returns the [windows x horizon] prices,
+        with include_initial the initial price as the first column like inverse_transform's first row.
+        '''
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        initial = np.asarray(initial_prices, dtype=np.float64).reshape(-1, 1)
+        if len(initial) != len(X):
+            raise ValueError(f"{len(X)} windows but {len(initial)} initial prices")
+        prices = np.cumsum(X, axis=1)
+        np.exp(prices, out=prices)
+        prices *= initial
+        if include_initial:
+            return np.concatenate([initial, prices], axis=1)
+        return prices
+
 
 class SignedLog1pMinMaxScaler(BaseEstimator, TransformerMixin):
     '''
@@ -84,6 +113,10 @@ class SignedLog1pMinMaxScaler(BaseEstimator, TransformerMixin):
         self.minmax_scaler.fit(X_transformed)
         return self
 
+    def partial_fit(self, X, y=None):
+        self.minmax_scaler.partial_fit(signed_log1p(X))
+        return self
+
     def transform(self, X, y=None):
         # Apply signed log1p transformation and then MinMax scaling
         X_transformed = signed_log1p(X)
@@ -95,44 +128,392 @@ class SignedLog1pMinMaxScaler(BaseEstimator, TransformerMixin):
         return np.sign(X_inverse_scaled) * (np.expm1(np.abs(X_inverse_scaled)))
 
 
+class SketchRobustScaler(BaseEstimator, TransformerMixin):
+    '''
+    RobustScaler (center on the median, scale by the interquartile range) with the quantiles taken from a
+    QuantileSketch, so it can be fitted a chunk at a time and merged with scalers fitted on other chunks. The
+    quantiles are approximate, to about 1/k in rank. The sketch's compaction is seeded with seed, so fitting the same
+    chunks gives the same scaler every run.
+    '''
+
+    def __init__(self, quantile_range=(25.0, 75.0), k=1024, seed=0):
+        self.quantile_range = quantile_range
+        self.k = k
+        self.seed = seed
+
+    def fit(self, X, y=None):
+        self.sketch_ = QuantileSketch(self.k, self.seed)
+        return self.partial_fit(X)
+
+    def partial_fit(self, X, y=None):
+        if not hasattr(self, "sketch_"):
+            self.sketch_ = QuantileSketch(self.k, self.seed)
+        self.sketch_.update(np.asarray(X))
+        self._set_quantiles()
+        return self
+
+    def merge(self, other):
+        if not hasattr(self, "sketch_"):
+            self.sketch_ = QuantileSketch(self.k, self.seed)
+        self.sketch_.merge(other.sketch_)
+        self._set_quantiles()
+        return self
+
+    def _set_quantiles(self):
+        low, median, high = self.sketch_.quantiles([self.quantile_range[0] / 100, 0.5, self.quantile_range[1] / 100])
+        self.center_ = median
+        self.scale_ = nonzero_scale(high - low)
+
+    def transform(self, X, y=None):
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype.kind == "f" else np.float64
+        return ((X - self.center_) / self.scale_).astype(dtype, copy=False)
+
+    def inverse_transform(self, X, y=None):
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype.kind == "f" else np.float64
+        return (X * self.scale_ + self.center_).astype(dtype, copy=False)
+
+
+def running_extreme(X, window, ufunc):
+    '''
+    ufunc (np.minimum or np.maximum) over the trailing window of each row in O(n) whatever the window, by van Herk /
+    Gil-Werman: the rows are cut into blocks of window rows, a window is the suffix of one block and the prefix of
+    the next, both of which are running accumulations.
+    '''
+    rows = len(X)
+    if window is None or window >= rows:
+        return ufunc.accumulate(X, axis=0)
+    # pad so the first rows' windows run into rows that can't win, and to a whole number of blocks
+    fill = np.inf if ufunc is np.minimum else -np.inf
+    blocks = -(-(rows + window - 1) // window)
+    padded = np.full((blocks * window,) + X.shape[1:], fill)
+    padded[window - 1:window - 1 + rows] = X
+    shaped = padded.reshape((blocks, window) + X.shape[1:])
+    prefix = ufunc.accumulate(shaped, axis=1).reshape(padded.shape)
+    suffix = ufunc.accumulate(shaped[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+    # the window ending at padded row p covers p - window + 1 .. p
+    ends = np.arange(window - 1, window - 1 + rows)
+    return ufunc(suffix[ends - window + 1], prefix[ends])
+
+
+class RollingScaler(BaseEstimator, TransformerMixin, metaclass=ABCMeta):
+    '''
+    Abstract base for the scalers that normalize each row with statistics of only the rows up to and including it, over a
+    trailing window of window rows or, with window None, everything so far. Rows must be one series in date order.
+    Nothing is fitted, so early rows are never scaled with statistics that include later ones. Until a full window
+    is available the statistics are over the rows there are.
+
+    The statistics of the last transform are kept: inverse_transform of as many rows undoes it row by row, anything
+    else is inverted with the last row's, the latest known, statistics.
+    '''
+
+    def __init__(self, window=None):
+        self.window = window
+
+    def fit(self, X, y=None):
+        return self
+
+    def partial_fit(self, X, y=None):
+        return self
+
+    @abstractmethod
+    def statistics(self, X):
+        # (center, scale) for every row of X, from it and the rows before it only
+        ...
+
+    def transform(self, X, y=None):
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype.kind == "f" else np.float64
+        center, scale = self.statistics(X.astype(np.float64))
+        self.center_, self.scale_ = center, nonzero_scale(scale)
+        return ((X - self.center_) / self.scale_).astype(dtype, copy=False)
+
+    def inverse_transform(self, X, y=None):
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype.kind == "f" else np.float64
+        center, scale = self.center_, self.scale_
+        if len(X) != len(center):
+            center, scale = center[-1], scale[-1]
+        return (X * scale + center).astype(dtype, copy=False)
+
+
+class RollingStandardScaler(RollingScaler):
+    '''
+    (x - mean) / std over the trailing window, from moments.rolling_moments: one pass with pandas' Welford updates, so
+    each window's statistics are as precise as if it were computed on its own and a window of one repeated value has
+    a std of exactly 0, whatever came before it.
+    '''
+
+    def statistics(self, X):
+        mean, variance = rolling_moments(X, self.window, ddof=0, min_periods=1)
+        return mean, np.sqrt(np.where(variance < 0, 0.0, variance))
+
+
+class RollingMinMaxScaler(RollingScaler):
+    # (x - min) / (max - min) over the trailing window, from O(n) running minima and maxima
+    def statistics(self, X):
+        low = running_extreme(X, self.window, np.minimum)
+        high = running_extreme(X, self.window, np.maximum)
+        return low, high - low
+
+
+class RollingRobustScaler(RollingScaler):
+    '''
+    (x - median) / interquartile range over the trailing window. The quantiles come from pandas' rolling (and
+    expanding) quantile, a skiplist over the window, so this one is O(n log window) rather than O(n).
+    '''
+
+    def __init__(self, window=None, quantile_range=(25.0, 75.0)):
+        super().__init__(window)
+        self.quantile_range = quantile_range
+
+    def statistics(self, X):
+        frame = pd.DataFrame(X.reshape(len(X), -1))
+        rolling = frame.expanding() if self.window is None else frame.rolling(self.window, min_periods=1)
+        low, median, high = [rolling.quantile(q / 100).to_numpy().reshape(X.shape)
+                             for q in (self.quantile_range[0], 50.0, self.quantile_range[1])]
+        return median, high - low
+
+
+# rolling_{type}_{n} scales over the last n rows, expanding_{type} over every row so far
+ROLLING_SCALERS = {"standard": RollingStandardScaler, "minmax": RollingMinMaxScaler, "robust": RollingRobustScaler}
+ROLLING_TYPE = re.compile(r"^(?:rolling_(?P<rolling>[a-z]+)_(?P<window>\d+)|expanding_(?P<expanding>[a-z]+))$")
+
+
+def is_fitted(scaler):
+    if isinstance(scaler, SignedLog1pMinMaxScaler):
+        return is_fitted(scaler.minmax_scaler)
+    if isinstance(scaler, (LogReturnScaler, RollingScaler)):
+        return True
+    return any(hasattr(scaler, name) for name in ("n_samples_seen_", "sketch_", "center_"))
+
+
+def merge_scalers(scaler, other):
+    '''
+    scaler with the statistics other was fitted on folded in, as if it had been partial_fit on both their rows:
+    exact for the moments of StandardScaler and the ranges of MinMaxScaler, approximate only for the quantile sketch
+    of SketchRobustScaler. Returns the merged scaler, which may be other when scaler was never fitted.
+    '''
+    if not is_fitted(other):
+        return scaler
+    if not is_fitted(scaler):
+        return other
+    if isinstance(scaler, StandardScaler):
+        # Chan et al's pairwise update of the mean and variance
+        count, other_count = scaler.n_samples_seen_, other.n_samples_seen_
+        total = count + other_count
+        delta = other.mean_ - scaler.mean_
+        squares = scaler.var_ * count + other.var_ * other_count + delta ** 2 * count * other_count / total
+        scaler.mean_ = scaler.mean_ + delta * other_count / total
+        scaler.var_ = squares / total
+        scaler.scale_ = nonzero_scale(np.sqrt(scaler.var_))
+        scaler.n_samples_seen_ = total
+    elif isinstance(scaler, MinMaxScaler):
+        # the other scaler's extremes are the only rows of it that can move the range
+        count = scaler.n_samples_seen_ + other.n_samples_seen_
+        extremes = np.vstack([other.data_min_, other.data_max_])
+        if hasattr(scaler, "feature_names_in_"):
+            extremes = pd.DataFrame(extremes, columns=scaler.feature_names_in_)
+        scaler.partial_fit(extremes)
+        scaler.n_samples_seen_ = count
+    elif isinstance(scaler, SignedLog1pMinMaxScaler):
+        scaler.minmax_scaler = merge_scalers(scaler.minmax_scaler, other.minmax_scaler)
+    elif isinstance(scaler, SketchRobustScaler):
+        scaler.merge(other)
+    elif not isinstance(scaler, (LogReturnScaler, RollingScaler)):
+        raise TypeError(f"Can't merge {type(scaler).__name__}")
+    return scaler
+
+
+def artifact_parameters(scaler, width):
+    '''
+    (kind, center, scale) of a fitted scaler's width columns in the terms of a scaler artifact (see scaler_artifact),
+    every fitted type being (x - center) / scale after an optional signed log1p.
+    '''
+    ones, zeros = np.ones(width), np.zeros(width)
+    if isinstance(scaler, StandardScaler):
+        return "affine", scaler.mean_ if scaler.with_mean else zeros, scaler.scale_ if scaler.with_std else ones
+    if isinstance(scaler, MinMaxScaler):
+        # sklearn's x * scale_ + min_
+        return "affine", -scaler.min_ / scaler.scale_, 1 / scaler.scale_
+    if isinstance(scaler, RobustScaler):
+        return "affine", scaler.center_ if scaler.with_centering else zeros, \
+            scaler.scale_ if scaler.with_scaling else ones
+    if isinstance(scaler, SketchRobustScaler):
+        return "affine", scaler.center_, scaler.scale_
+    if isinstance(scaler, SignedLog1pMinMaxScaler):
+        _, center, scale = artifact_parameters(scaler.minmax_scaler, width)
+        return "log1p", center, scale
+    if isinstance(scaler, LogReturnScaler):
+        return "log_returns", zeros, ones
+    # the rolling scalers have no fitted parameters to export, they scale with the history of the rows they're given
+    raise ValueError(f"Can't export {type(scaler).__name__}, only fitted scalers have an artifact")
+
+
+def make_scaler(scaler_type, streaming=False, lean=False):
+    if scaler_type == "standard":
+        return StandardScaler()
+    elif scaler_type == "minmax":
+        return MinMaxScaler()
+    elif scaler_type == "robust":
+        # the exact RobustScaler needs every row at once
+        return SketchRobustScaler() if streaming else RobustScaler()
+    elif scaler_type == "log_returns":
+        # scalers shared by a block of columns have no use for per transform intermediates
+        return LogReturnScaler(keep_intermediates=not lean)
+    elif scaler_type == "log1p":
+        return SignedLog1pMinMaxScaler()
+    match = ROLLING_TYPE.match(scaler_type)
+    if match is not None:
+        name = match.group("rolling") or match.group("expanding")
+        if name in ROLLING_SCALERS:
+            window = match.group("window")
+            return ROLLING_SCALERS[name](window=None if window is None else int(window))
+    raise ValueError(f"Unsupported scaler type: {scaler_type}")
+
+
+class GroupColumnScaler:
+    '''
+    One column of a scaler fitted on a block of columns (see CustomScaler grouped), so get_scaler still hands out
+    something that transforms a single column. The column is put in its place in a block of zeros, every scaler type
+    scales its columns independently so the other columns don't matter.
+    '''
+
+    def __init__(self, scaler, index, width):
+        self.scaler = scaler
+        self.index = index
+        self.width = width
+
+    def _column(self, method, X, **kwargs):
+        X = np.asarray(X)
+        block = np.zeros((len(X), self.width), dtype=X.dtype if X.dtype.kind == "f" else np.float64)
+        block[:, self.index] = X.reshape(len(X))
+        return getattr(self.scaler, method)(block, **kwargs)[:, [self.index]]
+
+    def transform(self, X):
+        return self._column("transform", X)
+
+    def inverse_transform(self, X, **kwargs):
+        if isinstance(self.scaler, LogReturnScaler):
+            # no fitted state, the inverse of one column is the inverse on its own
+            return self.scaler.inverse_transform(X, **kwargs)
+        return self._column("inverse_transform", X, **kwargs)
+
+
 class CustomScaler:
-    def __init__(self, config, df):
+    '''
+    Scales the columns of a frame with the scaler type the config maps them to. By default every column has its own
+    scaler and is fitted and transformed on its own. With grouped, all the columns of a scaler type are one 2-D block
+    (dtype, float32 by default) with one scaler fitted on it, so a fit or transform is a few array operations per
+    type instead of a pandas round trip per column, and the null checks are one vectorized check per block.
+
+    The rolling_{standard,minmax,robust}_{n} and expanding_{standard,minmax,robust} types scale each row with
+    statistics of only the rows before it (see RollingScaler), so nothing from the future of a date leaks into it.
+    They need the rows of one symbol in date order.
+
+    fit needs the whole frame. partial_fit instead takes it a chunk (a symbol file, a slice of a panel) at a time in
+    bounded memory, robust scaling switching to a quantile sketch, and merge combines scalers partial_fit on
+    different chunks, by parallel workers for example.
+    '''
+
+    def __init__(self, config, df=None, grouped=False, dtype=np.float32):
         self.config = config
         self.scaler_mapping = {}
         self.scalers = {}
+        self.grouped = grouped
+        self.dtype = dtype
+        # scaler type of each column, and for grouped the scaler fitted on each type's block of columns
+        self.column_types = {}
+        self.group_scalers = {}
+        self.streaming = False
         self._process_config(df)
 
     def _process_config(self, df):
         for entry in self.config:
             scaler_type = entry.get('type', 'standard')
-            columns = entry.get('columns', [])
+            columns = list(entry.get('columns', []))
             regex_pattern = entry.get('regex', None)
 
-            if regex_pattern:
+            if regex_pattern and df is not None:
                 pattern = re.compile(regex_pattern)
                 matched_columns = [col for col in df.columns if pattern.match(col)]
                 columns.extend(matched_columns)
 
             for column in columns:
-                if scaler_type == "standard":
-                    self.scaler_mapping[column] = StandardScaler()
-                elif scaler_type == "minmax":
-                    self.scaler_mapping[column] = MinMaxScaler()
-                elif scaler_type == "robust":
-                    self.scaler_mapping[column] = RobustScaler()
-                elif scaler_type == "log_returns":
-                    self.scaler_mapping[column] = LogReturnScaler()
-                elif scaler_type == "log1p":
-                    self.scaler_mapping[column] = SignedLog1pMinMaxScaler()
-                else:
-                    raise ValueError(f"Unsupported scaler type: {scaler_type}")
+                self.scaler_mapping[column] = make_scaler(scaler_type)
+                self.column_types[column] = scaler_type
+
+    @property
+    def groups(self):
+        # scaler type to its columns, in config order
+        groups = {}
+        for column, scaler_type in self.column_types.items():
+            groups.setdefault(scaler_type, []).append(column)
+        return groups
+
+    def _block(self, df, columns, when):
+        block = df[columns].to_numpy(dtype=self.dtype)
+        check_block(block, columns, when)
+        return block
+
+    def _reset_scalers(self, streaming):
+        self.streaming = streaming
+        self.scaler_mapping = {column: make_scaler(scaler_type, streaming)
+                               for column, scaler_type in self.column_types.items()}
+        self.group_scalers = {}
 
     def fit(self, df):
+        if self.streaming:
+            self._reset_scalers(streaming=False)
+        if self.grouped:
+            self.group_scalers = {
+                scaler_type: make_scaler(scaler_type, lean=True).fit(self._block(df, columns, "before fit"))
+                for scaler_type, columns in self.groups.items()}
+            return
 
         for column, scaler in self.scaler_mapping.items():
             scaler.fit(df[[column]])
 
+    def partial_fit(self, df):
+        '''
+        Updates the fit with the rows of df, the next chunk of the data. Every chunk needs the scaled columns.
+        '''
+        if not self.streaming:
+            self._reset_scalers(streaming=True)
+        if self.grouped:
+            for scaler_type, columns in self.groups.items():
+                if scaler_type not in self.group_scalers:
+                    self.group_scalers[scaler_type] = make_scaler(scaler_type, streaming=True, lean=True)
+                self.group_scalers[scaler_type].partial_fit(self._block(df, columns, "before fit"))
+            return self
+        for column, scaler in self.scaler_mapping.items():
+            assert not df[column].isnull().any(), f"{column} has null before fit"
+            scaler.partial_fit(df[[column]])
+        return self
+
+    def merge(self, other):
+        '''
+        Folds in the fit of another CustomScaler with the same columns and grouping, fitted on other rows. Merging
+        the scalers of every chunk gives the same statistics as one scaler partial_fit on all of them (up to the
+        sketch's approximation for robust scaling).
+        '''
+        if self.column_types != other.column_types or self.grouped != other.grouped:
+            raise ValueError("Can only merge scalers with the same columns and grouping")
+        self.streaming = self.streaming or other.streaming
+        if self.grouped:
+            for scaler_type, scaler in other.group_scalers.items():
+                self.group_scalers[scaler_type] = merge_scalers(self.group_scalers[scaler_type], scaler) \
+                    if scaler_type in self.group_scalers else scaler
+        else:
+            self.scaler_mapping = {column: merge_scalers(scaler, other.scaler_mapping[column])
+                                   for column, scaler in self.scaler_mapping.items()}
+        return self
+
     def transform(self, df, in_place=False):
+        if self.grouped:
+            return self._transform_grouped(df, in_place)
+
         if not in_place:
             df = df.copy()
 
@@ -143,17 +524,37 @@ class CustomScaler:
             assert not df[column].isnull().any(), f"{column} has null after transform"
         return df
 
-    def fit_transform(self, df):
+    def _transform_grouped(self, df, in_place):
+        scaled = {}
+        for scaler_type, columns in self.groups.items():
+            block = self.group_scalers[scaler_type].transform(self._block(df, columns, "before transform"))
+            scaled[scaler_type] = np.asarray(block, dtype=self.dtype)
+            check_block(scaled[scaler_type], columns, "after transform")
+        if not in_place:
+            # nothing is copied, the scaled columns are swapped for new arrays rather than written into
+            df = df.copy(deep=False)
+        for scaler_type, block in scaled.items():
+            df[self.groups[scaler_type]] = block
+        return df
+
+    def fit_transform(self, df, in_place=False):
         self.fit(df)
-        return self.transform(df)
+        return self.transform(df, in_place)
 
     def get_scaler(self, column_name):
-        if column_name in self.scaler_mapping:
-            return self.scaler_mapping[column_name]
-        else:
+        if column_name not in self.scaler_mapping:
             raise ValueError(f"No scaler found for column: {column_name}")
+        if self.grouped:
+            columns = self.groups[self.column_types[column_name]]
+            return GroupColumnScaler(self.group_scalers[self.column_types[column_name]],
+                                     columns.index(column_name), len(columns))
+        return self.scaler_mapping[column_name]
 
     def inverse_transform(self, df):
+        if self.grouped:
+            for scaler_type, columns in self.groups.items():
+                df[columns] = self.group_scalers[scaler_type].inverse_transform(df[columns].to_numpy(dtype=self.dtype))
+            return df
         for column, scaler in self.scaler_mapping.items():
             df[[column]] = scaler.inverse_transform(df[[column]])
         return df
@@ -163,19 +564,53 @@ class CustomScaler:
         joblib.dump({
             "config": self.config,
             "scaler_mapping": self.scaler_mapping,
-            "scalers": {col: scaler for col, scaler in self.scaler_mapping.items()}
+            "scalers": {col: scaler for col, scaler in self.scaler_mapping.items()},
+            "grouped": self.grouped,
+            "streaming": self.streaming,
+            "dtype": np.dtype(self.dtype).name,
+            "column_types": self.column_types,
+            "group_scalers": self.group_scalers
         }, path)
 
+    def export(self, path):
+        '''
+        Writes the fitted parameters of every column to a compact versioned .npz (see scaler_artifact). Scoring
+        processes load it with scaler_artifact.load_artifact and transform and invert with NumPy arithmetic, no
+        sklearn estimators or unpickling.
+        '''
+        columns, kinds, centers, scales, cumsums, amplifiers = [], [], [], [], [], []
+        for scaler_type, group in self.groups.items():
+            fitted = [(self.group_scalers.get(scaler_type), group)] if self.grouped else \
+                [(self.scaler_mapping[column], [column]) for column in group]
+            for scaler, scaled in fitted:
+                if not is_fitted(scaler):
+                    raise ValueError(f"{scaled} not fitted, fit before export")
+                kind, center, scale = artifact_parameters(scaler, len(scaled))
+                columns.extend(scaled)
+                kinds.extend([kind] * len(scaled))
+                centers.append(np.broadcast_to(center, len(scaled)))
+                scales.append(np.broadcast_to(scale, len(scaled)))
+                cumsums.extend([getattr(scaler, "do_cumsum", True)] * len(scaled))
+                amplifiers.extend([getattr(scaler, "amplifier", 2)] * len(scaled))
+        save_artifact(path, columns, kinds, np.concatenate(centers), np.concatenate(scales),
+                      self.dtype if self.grouped else np.float64,
+                      {column: self.column_types[column] for column in columns}, cumsums, amplifiers)
+
     @staticmethod
     def load(path):
         data = joblib.load(path)
-        custom_scaler = CustomScaler(data['config'])
+        custom_scaler = CustomScaler(data['config'], grouped=data.get('grouped', False),
+                                     dtype=np.dtype(data.get('dtype', 'float32')))
         custom_scaler.scaler_mapping = data['scalers']
+        custom_scaler.column_types = data.get('column_types', custom_scaler.column_types)
+        custom_scaler.group_scalers = data.get('group_scalers', {})
+        custom_scaler.streaming = data.get('streaming', False)
         return custom_scaler
 
     def get_scaled(self, df):
         return self.transform(df.copy())
 
+
 # # Example usage
 # config = [
 #     {'columns': ['a', 'b', 'c'], 'type': 'standard', 'augment': None},
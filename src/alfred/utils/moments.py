@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def rolling_moments(x, n, ddof=1, min_periods=None):
+    '''
+    (mean, variance) over the trailing n rows of each column of an array (every row so far when n is None), NaN
+    until min_periods (n by default) valid values. The rows are walked once with the Welford add and remove updates,
+    Kahan compensation and flat window check of pandas' roll_var, in its order, so the variance is bit for bit
+    rolling(n).var(ddof) and no stretch of the series costs the precision of another. A window of one repeated value
+    has exactly that mean and a variance of 0.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    window = len(x) if n is None else n
+    min_periods = max(window if min_periods is None else min_periods, 1)
+    shape = x.shape[1:]
+    mean_x = np.zeros(shape)
+    ssqdm_x = np.zeros(shape)
+    compensation_add = np.zeros(shape)
+    compensation_remove = np.zeros(shape)
+    nobs = np.zeros(shape, dtype=np.int64)
+    num_consecutive_same_value = np.zeros(shape, dtype=np.int64)
+    prev_value = np.full(shape, np.nan)
+    mean = np.full(x.shape, np.nan)
+    variance = np.full(x.shape, np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for t in range(len(x)):
+            value = x[t]
+            if window == 1:
+                # pandas starts over whenever a window shares nothing with the previous one
+                for state in [mean_x, ssqdm_x, compensation_add, compensation_remove, nobs,
+                              num_consecutive_same_value]:
+                    state[...] = 0
+            elif t >= window:
+                leaving = x[t - window]
+                valid = ~np.isnan(leaving)
+                nobs -= valid
+                remaining = valid & (nobs > 0)
+                prev_mean = mean_x - compensation_remove
+                y = leaving - compensation_remove
+                delta = y - mean_x
+                np.copyto(compensation_remove, delta + mean_x - y, where=remaining)
+                updated = mean_x - delta / nobs
+                np.copyto(ssqdm_x, ssqdm_x - (leaving - prev_mean) * (leaving - updated), where=remaining)
+                np.copyto(mean_x, updated, where=remaining)
+                emptied = valid & (nobs == 0)
+                mean_x[emptied] = 0.0
+                ssqdm_x[emptied] = 0.0
+
+            valid = ~np.isnan(value)
+            nobs += valid
+            np.copyto(num_consecutive_same_value,
+                      np.where(value == prev_value, num_consecutive_same_value + 1, 1), where=valid)
+            np.copyto(prev_value, value, where=valid)
+            prev_mean = mean_x - compensation_add
+            y = value - compensation_add
+            delta = y - mean_x
+            np.copyto(compensation_add, delta + mean_x - y, where=valid)
+            updated = mean_x + delta / nobs
+            np.copyto(ssqdm_x, ssqdm_x + (value - prev_mean) * (value - updated), where=valid)
+            np.copyto(mean_x, updated, where=valid)
+
+            flat = (nobs == 1) | (num_consecutive_same_value >= nobs)
+            ready = nobs >= min_periods
+            mean[t] = np.where(ready, np.where(flat, prev_value, mean_x), np.nan)
+            variance[t] = np.where(ready & (nobs > ddof), np.where(flat, 0.0, ssqdm_x / (nobs - ddof)), np.nan)
+    return mean, variance
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class QuantileSketch:
+    '''
+    Mergeable streaming quantile sketch in the style of KLL, for the columns of a block at once. Values are kept in
+    levels, an item on level l standing for 2^l of the values seen. When a level outgrows its capacity it is sorted
+    and every other item (from a random offset) moves up a level, so memory stays around k * log(n / k) items per
+    column whatever n is, with a rank error of roughly 1/k. Two sketches of the same columns merge by pooling their
+    levels, so workers can each sketch part of the data and combine the results.
+
+    Every column gets the same number of values (rows of a block), so all columns share level sizes and each level is
+    one [items, columns] array.
+    '''
+
+    def __init__(self, k=256, seed=None):
+        self.k = k
+        self.levels = []
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        # lower levels get geometrically less room, (2/3)^depth of k below the top one
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[:, None]
+        if len(X) == 0:
+            return self
+        if not self.levels:
+            self.levels.append(np.empty((0, X.shape[1])))
+        self.levels[0] = np.concatenate([self.levels[0], X])
+        self.count += len(X)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.levels = [level.copy() for level in other.levels]
+            self.count = other.count
+            return self
+        if self.levels[0].shape[1] != other.levels[0].shape[1]:
+            raise ValueError("Can't merge sketches of a different number of columns")
+        for level, items in enumerate(other.levels):
+            if level < len(self.levels):
+                self.levels[level] = np.concatenate([self.levels[level], items])
+            else:
+                self.levels.append(items.copy())
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty((0, items.shape[1])))
+                # an even number are compacted, an odd one out stays behind so no weight is lost
+                items = np.sort(items, axis=0)
+                keep = len(items) % 2
+                promoted = items[keep + self.rng.integers(2)::2]
+                self.levels[level] = items[:keep]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, q):
+        '''
+        Approximate quantiles (q in [0, 1], scalar or list) of each column, shape (len(q), columns) for a list.
+        '''
+        if self.count == 0:
+            raise ValueError("Quantiles of an empty sketch")
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(items, axis=0)
+        ordered = np.take_along_axis(items, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        total = cumulative[-1]
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        out = np.empty((len(qs), items.shape[1]))
+        for i, quantile in enumerate(qs):
+            position = np.argmax(cumulative >= quantile * total, axis=0)
+            out[i] = ordered[position, np.arange(items.shape[1])]
+        return out if np.ndim(q) else out[0]
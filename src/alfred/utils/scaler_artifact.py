@@ -0,0 +1,165 @@
+import json
+
+import numpy as np
+
+# bumped whenever the layout of the artifact changes, load_artifact refuses anything newer than it knows
+ARTIFACT_VERSION = 1
+
+# how each column is scaled once its parameters are known:
+#   affine        (x - center) / scale                        standard, minmax, robust
+#   log1p         (signed_log1p(x) - center) / scale          log1p
+#   log_returns   amplified (cumulative) log returns          log_returns, nothing fitted
+KINDS = ["affine", "log1p", "log_returns"]
+
+
+def signed_log1p(x):
+    return np.sign(x) * np.log1p(np.abs(x))
+
+
+def forward_fill(X):
+    # last non-NaN value down each column of a 2-D array, leading NaNs stay NaN
+    positions = np.where(~np.isnan(X), np.arange(len(X))[:, None], 0)
+    return np.take_along_axis(X, np.maximum.accumulate(positions, axis=0), axis=0)
+
+
+def check_block(block, columns, when):
+    # one vectorized null check for a whole block, the columns are only looked at to report a failure
+    nulls = np.isnan(block).any(axis=0)
+    assert not nulls.any(), f"{[column for column, null in zip(columns, nulls) if null]} has null {when}"
+
+
+def log_return_transform(X, cumsum=True, amplifier=2):
+    '''
+    LogReturnScaler's transform of a 2-D block of prices in one output array: zeros and nulls are replaced by the
+    last good value, then the log returns, their cumsum and the amplification go into the same array, the last row
+    repeated so the rows line up with the input.
+    '''
+    logs = np.log(forward_fill(np.where(X == 0, np.nan, X)))
+    out = np.empty_like(logs)
+    np.subtract(logs[1:], logs[:-1], out=out[:-1])
+    if cumsum:
+        np.cumsum(out[:-1], axis=0, out=out[:-1])
+    if amplifier != 0:
+        out[:-1] *= amplifier
+    out[-1] = out[-2]
+    return out
+
+
+def save_artifact(path, columns, kinds, center, scale, dtype="float32", column_types=None, cumsum=None,
+                  amplifier=None):
+    '''
+    Writes per-column scaling parameters as a versioned .npz: the column names and kinds as string arrays, center and
+    scale (and the log return settings) as float64 arrays in column order, and a small JSON header with the version,
+    dtype and each column's scaler type. Nothing is pickled, so it loads without sklearn or joblib.
+    '''
+    columns = list(columns)
+    width = len(columns)
+    header = {"version": ARTIFACT_VERSION, "dtype": np.dtype(dtype).name,
+              "column_types": column_types or {column: kind for column, kind in zip(columns, kinds)}}
+    with open(path, "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)), columns=np.array(columns, dtype=str),
+                 kinds=np.array(kinds, dtype=str), center=np.asarray(center, dtype=np.float64),
+                 scale=np.asarray(scale, dtype=np.float64),
+                 cumsum=np.ones(width, dtype=bool) if cumsum is None else np.asarray(cumsum, dtype=bool),
+                 amplifier=np.full(width, 2.0) if amplifier is None else np.asarray(amplifier, dtype=np.float64))
+
+
+def load_artifact(path):
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data["header"]))
+        if header["version"] > ARTIFACT_VERSION:
+            raise ValueError(f"{path} is artifact version {header['version']}, this loader reads up to "
+                             f"{ARTIFACT_VERSION}")
+        return ScalerArtifact(data["columns"].tolist(), data["kinds"].tolist(), data["center"], data["scale"],
+                              dtype=header["dtype"], column_types=header["column_types"], cumsum=data["cumsum"],
+                              amplifier=data["amplifier"])
+
+
+class ScalerArtifact:
+    '''
+    A fitted CustomScaler reduced to its per-column parameters (see CustomScaler.export), for scoring processes that
+    only need to transform features and invert predictions. Everything is plain NumPy arithmetic over blocks of
+    columns, this module imports neither sklearn nor pandas, so loading one costs a file read.
+
+    transform and inverse_transform take and return frames like CustomScaler's. inverse_column inverts one column's
+    values of any shape, a [windows x horizon] matrix of predictions for example.
+    '''
+
+    def __init__(self, columns, kinds, center, scale, dtype="float32", column_types=None, cumsum=None,
+                 amplifier=None):
+        self.columns = list(columns)
+        self.kinds = list(kinds)
+        unknown = set(self.kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unsupported column kinds: {sorted(unknown)}, expected one of {KINDS}")
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.dtype = np.dtype(dtype)
+        self.column_types = column_types or dict(zip(self.columns, self.kinds))
+        width = len(self.columns)
+        self.cumsum = np.ones(width, dtype=bool) if cumsum is None else np.asarray(cumsum, dtype=bool)
+        self.amplifier = np.full(width, 2.0) if amplifier is None else np.asarray(amplifier, dtype=np.float64)
+        self.column_index = {column: j for j, column in enumerate(self.columns)}
+
+        kinds = np.array(self.kinds)
+        # positions of the columns scaled with center and scale, and which of those take a signed log1p first
+        self.affine = np.flatnonzero(kinds != "log_returns")
+        self.log1p = kinds[self.affine] == "log1p"
+        self.log_returns = np.flatnonzero(kinds == "log_returns")
+
+    def transform_block(self, X):
+        '''
+        Scales a [rows, columns] array holding every column of the artifact in its column order.
+        '''
+        X = np.asarray(X, dtype=np.float64)
+        check_block(X, self.columns, "before transform")
+        out = np.empty(X.shape, dtype=self.dtype)
+        if len(self.affine):
+            block = X[:, self.affine]
+            if self.log1p.any():
+                block[:, self.log1p] = signed_log1p(block[:, self.log1p])
+            out[:, self.affine] = (block - self.center[self.affine]) / self.scale[self.affine]
+        # log return columns share their settings in practice, each distinct setting is one block
+        settings = {(bool(self.cumsum[j]), float(self.amplifier[j])) for j in self.log_returns}
+        for cumsum, amplifier in settings:
+            take = [j for j in self.log_returns if (self.cumsum[j], self.amplifier[j]) == (cumsum, amplifier)]
+            out[:, take] = log_return_transform(X[:, take], cumsum, amplifier)
+        check_block(out, self.columns, "after transform")
+        return out
+
+    def transform(self, df, in_place=False):
+        block = self.transform_block(df[self.columns].to_numpy(dtype=np.float64))
+        if not in_place:
+            df = df.copy(deep=False)
+        df[self.columns] = block
+        return df
+
+    def inverse_column(self, column, values, initial_prices=None):
+        '''
+        Undoes the scaling of column for values of any shape. A log return column, like LogReturnScaler, reads each
+        row of values as the log returns of a window and needs every window's initial price.
+        '''
+        j = self.column_index[column]
+        values = np.asarray(values, dtype=np.float64)
+        if self.kinds[j] == "log_returns":
+            if initial_prices is None:
+                raise ValueError(f"initial_prices is required to recover prices for {column}")
+            windows = np.atleast_2d(values)
+            return np.exp(np.cumsum(windows, axis=1)) * np.asarray(initial_prices, dtype=np.float64).reshape(-1, 1)
+        unscaled = values * self.scale[j] + self.center[j]
+        if self.kinds[j] == "log1p":
+            return np.sign(unscaled) * np.expm1(np.abs(unscaled))
+        return unscaled
+
+    def inverse_transform(self, df):
+        # the scaled columns df has, a frame of predicted columns only for example
+        present = [j for j, column in enumerate(self.columns) if column in df.columns]
+        returns = [self.columns[j] for j in present if self.kinds[j] == "log_returns"]
+        if returns:
+            raise ValueError(f"{returns} are log returns, invert them with inverse_column and their initial prices")
+        columns = [self.columns[j] for j in present]
+        unscaled = df[columns].to_numpy(dtype=np.float64) * self.scale[present] + self.center[present]
+        log1p = np.array(self.kinds)[present] == "log1p"
+        unscaled[:, log1p] = np.sign(unscaled[:, log1p]) * np.expm1(np.abs(unscaled[:, log1p]))
+        df[columns] = unscaled.astype(self.dtype)
+        return df
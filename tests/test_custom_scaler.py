@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alfred.utils.custom_scaler import RollingStandardScaler
+
+
+@pytest.mark.parametrize("window", [None, 1, 2, 7, 60])
+def test_rolling_standard_scaler_matches_pandas(window):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([1e6 + np.cumsum(rng.normal(0, 1000, 400)), rng.normal(0, 1, 400)])
+    frame = pd.DataFrame(X)
+    rolling = frame.expanding() if window is None else frame.rolling(window, min_periods=1)
+
+    center, scale = RollingStandardScaler(window).statistics(X)
+
+    np.testing.assert_array_equal(scale, rolling.std(ddof=0).to_numpy())
+    np.testing.assert_allclose(center, rolling.mean().to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+def test_flat_windows_after_a_trend_have_no_spread():
+    # a long climb then a flat stretch, the running sums of the whole history must not leak into the flat windows
+    X = np.concatenate([1e6 + np.arange(1_000) * 123.456, np.full(50, 0.1)])[:, None]
+
+    scaler = RollingStandardScaler(window=10)
+    scaled = scaler.transform(X)
+
+    assert (scaler.statistics(X)[1][-40:] == 0).all()
+    assert (scaled[-40:] == 0).all()
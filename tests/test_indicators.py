@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alfred.data.indicators import rolling_mean, rolling_moments, rolling_std
+
+
+def make_block(rows=600, seed=0):
+    # [date, symbol] closes with NaN gaps, a flat stretch, zeros, a large level with a tiny spread and a late listing
+    rng = np.random.default_rng(seed)
+    x = 100 + np.cumsum(rng.normal(0, 1, (rows, 6)), axis=0)
+    x[rng.random(x.shape) < 0.05] = np.nan
+    x[100:140, 1] = x[100, 1]
+    x[300:305, 2] = 0.0
+    x[:, 3] = 1e6 + rng.normal(0, 1e-3, rows)
+    x[:50, 4] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 20, 90])
+def test_rolling_std_and_mean_match_pandas_exactly(n):
+    x = make_block()
+    frame = pd.DataFrame(x)
+
+    np.testing.assert_array_equal(rolling_std(x, n), frame.rolling(n).std().to_numpy())
+    np.testing.assert_array_equal(rolling_mean(x, n), frame.rolling(n).mean().to_numpy())
+
+
+@pytest.mark.parametrize("ddof", [0, 1])
+@pytest.mark.parametrize("n, min_periods", [(2, 1), (3, 2), (20, 1), (None, 1)])
+def test_rolling_moments_variance_matches_pandas_exactly(n, min_periods, ddof):
+    x = make_block(seed=1)
+    frame = pd.DataFrame(x)
+    window = frame.expanding(min_periods) if n is None else frame.rolling(n, min_periods=min_periods)
+
+    _, variance = rolling_moments(x, n, ddof, min_periods)
+
+    np.testing.assert_array_equal(variance, window.var(ddof=ddof).to_numpy())
+
+
+def test_flat_windows_have_no_spread():
+    x = np.full((50, 2), 0.1)
+    x[:, 1] = 1e6 + 0.3
+
+    mean, variance = rolling_moments(x, 5, ddof=0, min_periods=1)
+
+    assert (variance == 0).all()
+    assert (mean == x).all()
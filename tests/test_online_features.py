@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alfred.data.online_features import OnlineFeatureState
+from alfred.data.processors import attach_moving_average_diffs
+
+
+def make_bars(rows=700, seed=0):
+    # a daily random walk with NaN gaps, flat stretches and zero volume, the cases the running sums special-case
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+    volume = rng.integers(1_000, 1_000_000, rows).astype(np.float64)
+    close[rng.random(rows) < 0.03] = np.nan
+    close[200:260] = close[199]
+    close[400:405] = np.nan
+    volume[rng.random(rows) < 0.02] = np.nan
+    volume[300:420] = 0.0
+    volume[500:520] = volume[499]
+    return pd.DataFrame({"Close": close, "Volume": volume},
+                        index=pd.bdate_range("2015-01-01", periods=rows, name="Date"))
+
+
+@pytest.mark.filterwarnings("ignore:The default fill_method:FutureWarning")
+@pytest.mark.parametrize("moving_averages_days, pred", [([7, 30, 90, 180], [7, 30, 120, 240]), ([1, 2, 3], [1, 2])])
+def test_replay_with_saved_state_matches_batch(tmp_path, moving_averages_days, pred):
+    bars = make_bars()
+    half = len(bars) // 2
+
+    state = OnlineFeatureState("TEST", moving_averages_days, pred)
+    rows = []
+    labels = {}
+    for i, (date, close, volume) in enumerate(zip(bars.index, bars["Close"], bars["Volume"])):
+        if i == half:
+            # a daily job stops here and the next run picks the state back up
+            state.save(tmp_path / "TEST.json")
+            state = OnlineFeatureState.load(tmp_path / "TEST.json")
+        features, resolved = state.update(date, close, volume)
+        rows.append(features)
+        for label, (label_date, value) in resolved.items():
+            labels[(label, label_date)] = value
+    online = pd.DataFrame(rows, index=bars.index)
+
+    batch, feature_columns = attach_moving_average_diffs(bars.copy(), moving_averages_days)
+    pd.testing.assert_frame_equal(online[feature_columns], batch[feature_columns], check_exact=True)
+
+    for term in pred:
+        label = f'price_change_term_{term}'
+        expected = bars['Close'].pct_change(periods=term).shift(periods=-term)
+        actual = pd.Series([labels.get((label, date), math.nan) for date in bars.index], index=bars.index,
+                           name='Close')
+        pd.testing.assert_series_equal(actual, expected, check_exact=True, obj=label)
+
+
+@pytest.mark.filterwarnings("ignore:The default fill_method:FutureWarning")
+def test_replay_lays_out_like_batch():
+    bars = make_bars(seed=1)
+    replayed = OnlineFeatureState("TEST").replay(bars)
+
+    batch, feature_columns = attach_moving_average_diffs(bars.copy())
+    for pred in [7, 30, 120, 240]:
+        label = f'price_change_term_{pred}'
+        batch[label] = batch['Close'].pct_change(periods=pred).shift(periods=-pred)
+        feature_columns.append(label)
+    pd.testing.assert_frame_equal(replayed, batch[feature_columns], check_exact=True)
+
+
+def test_update_rejects_stale_bars():
+    state = OnlineFeatureState("TEST")
+    state.update("2020-01-02", 10.0, 100.0)
+    with pytest.raises(ValueError):
+        state.update("2020-01-02", 11.0, 100.0)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alfred.data.processors import attach_moving_average_diffs, attach_panel_moving_average_diffs, rolling_means
+
+
+def make_panel(symbols=12, seed=0):
+    # random walks of uneven length with NaN gaps, flat stretches, zero volume and signed zeros
+    rng = np.random.default_rng(seed)
+    frames = []
+    for symbol in range(symbols):
+        rows = int(rng.integers(1, 400))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+        volume = rng.integers(0, 1_000_000, rows).astype(np.float64)
+        close[rng.random(rows) < 0.03] = np.nan
+        if rows > 60:
+            close[10:30] = close[10]
+            volume[20:45] = 0.0
+        signed = rng.normal(0, 1, rows)
+        signed[rng.random(rows) < 0.1] = -0.0
+        frames.append(pd.DataFrame({"Symbol": f"S{symbol:03d}", "Close": close, "Volume": volume, "Signed": signed}))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("max_rows_per_chunk", [2_000_000, 500])
+def test_rolling_means_match_pandas_exactly(max_rows_per_chunk):
+    panel = make_panel()
+    columns = ["Close", "Volume", "Signed"]
+    symbols = panel["Symbol"].to_numpy()
+    starts = np.append(True, symbols[1:] != symbols[:-1])
+    windows = [1, 2, 3, 7, 30, 90]
+
+    means = rolling_means(panel[columns].to_numpy(), starts, windows, max_rows_per_chunk)
+
+    for window, mean in zip(windows, means):
+        expected = panel.groupby("Symbol")[columns].rolling(window).mean().to_numpy()
+        np.testing.assert_array_equal(mean, expected, err_msg=f"window {window}")
+
+
+def test_panel_moving_average_diffs_match_per_symbol():
+    panel = make_panel(seed=1)
+
+    result, new_columns = attach_panel_moving_average_diffs(panel.copy(), symbol_column="Symbol",
+                                                            max_rows_per_chunk=1_000)
+
+    for _, frame in panel.groupby("Symbol"):
+        expected, expected_columns = attach_moving_average_diffs(frame.copy())
+        assert new_columns == expected_columns
+        pd.testing.assert_frame_equal(result.loc[frame.index, new_columns], expected[new_columns],
+                                      check_exact=True)
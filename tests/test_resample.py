@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from alfred.data.resample import resample_bars
+
+
+def test_symbols_keep_their_own_columns():
+    dates = pd.bdate_range("2020-01-01", periods=30, name="Date")
+    prices = pd.DataFrame({"Open": 1.0, "Close": 2.0, "Volume": np.arange(30)}, index=dates)
+    dividends = pd.DataFrame({"Close": 3.0, "Dividends": np.append(np.zeros(29), 0.5), "Volume": np.arange(30)},
+                             index=dates)
+
+    out = resample_bars({"A": prices, "B": dividends}, "1wk")
+
+    assert list(out["A"].columns) == ["Open", "Close", "Volume"]
+    assert list(out["B"].columns) == ["Close", "Dividends", "Volume"]
+    assert out["B"]["Dividends"].iloc[-1] == 0.5
+    assert out["B"]["Volume"].sum() == np.arange(30).sum()
+    assert out["B"]["Volume"].dtype == np.int64